@@ -43,30 +43,43 @@ Step 4: Prediction
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.decomposition import TruncatedSVD
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 import os
 import json
+import time
 from datetime import datetime
 import random
+from training_engines import ENGINES, get_engine, explained_variance_ratio, compatible_factors
+from matrix_snapshot import MemmapCSR
 
 class CollaborativeFilteringModel:
-    def __init__(self, n_factors=10):
+    def __init__(self, n_factors=10, engine="svd"):
         """
         Initialize the Collaborative Filtering Model
         
         Args:
             n_factors: Number of latent factors for SVD (default 10)
                       Higher = more complex features, more computation
+            engine: Training engine - "svd" (TruncatedSVD from scratch) or one of
+                    the engines in training_engines.py ("subspace", "als")
         """
         self.n_factors = n_factors
+        self.engine = engine
         self.svd_model = None
         self.user_item_matrix = None
+        self.interaction_matrix = None
         self.product_ids = None
         self.user_ids = None
+        self.user_factors = None
+        self.product_factors = None
+        self.explained_variance = None
+        self.training_info = {}
         self.is_trained = False
         self.training_date = None
+        self._session_engine = None
         
     def generate_synthetic_data(self, n_users=5, n_products=45, n_interactions=3000, random_seed=42):
         """
@@ -139,6 +152,7 @@ class CollaborativeFilteringModel:
         self.user_item_matrix = matrix
         self.user_ids = matrix.index.tolist()
         self.product_ids = matrix.columns.tolist()
+        self.interaction_matrix = sparse.csr_matrix(matrix.values, dtype=np.float64)
         
         sparsity = (matrix == 0).sum().sum() / (matrix.shape[0] * matrix.shape[1])
         print(f" Matrix shape: {matrix.shape} (Users × Products)")
@@ -146,7 +160,7 @@ class CollaborativeFilteringModel:
         
         return matrix
     
-    def train(self, interactions_df):
+    def train(self, interactions_df, warm_start=None):
         """
         Train SVD model for collaborative filtering
         
@@ -158,23 +172,20 @@ class CollaborativeFilteringModel:
         5. Σ: Importance of each latent factor
         
         The model learns what makes products similar and what users like
+        
+        Args:
+            interactions_df: DataFrame with columns user_id, product_id, rating
+            warm_start: Optional factors of the previous model (see get_warm_start()).
+                        Iterative engines start from them instead of from scratch;
+                        the "svd" engine and factors of a different engine are ignored.
         """
-        print("\n Training Collaborative Filtering Model (SVD)...")
+        print(f"\n Training Collaborative Filtering Model ({self.engine})...")
         
         # Step 1: Build matrix
         self.build_user_item_matrix(interactions_df)
         
-        # Step 2: Apply SVD (Matrix Factorization)
-        print(f"   • Using {self.n_factors} latent factors")
-        print("   • Factorizing user-item matrix...")
-        
-        self.svd_model = TruncatedSVD(n_components=self.n_factors, random_state=42)
-        self.svd_model.fit(self.user_item_matrix.values)
-        
-        # Step 3: Calculate explained variance
-        explained_var = self.svd_model.explained_variance_ratio_.sum()
-        print(f"   • Explained variance: {explained_var*100:.1f}%")
-        print(f"   • This means the model captures {explained_var*100:.1f}% of rating patterns")
+        # Step 2 & 3: Apply SVD (Matrix Factorization)
+        self._factorize(warm_start)
         
         self.is_trained = True
         self.training_date = datetime.now().isoformat()
@@ -186,6 +197,99 @@ class CollaborativeFilteringModel:
         
         return self
     
+    def train_from_snapshot(self, snapshot, warm_start=None):
+        """
+        Train from a disk-backed, memory-mapped matrix snapshot (out-of-core)
+        
+        The matrix is never loaded as a whole: the snapshot is read in row
+        chunks by a streaming randomized SVD, so memory is bounded by the
+        chunk size and the factor size instead of the dataset size.
+        
+        Args:
+            snapshot: matrix_snapshot.MemmapCSR
+            warm_start: Optional factors of the previous model (see get_warm_start())
+        """
+        print(f"\n Training Collaborative Filtering Model out-of-core ({snapshot.directory})...")
+        
+        # Every subspace iteration is a full pass over the snapshot on disk;
+        # the out-of-core engine needs only a few
+        self.engine = "outofcore"
+        
+        self.user_item_matrix = None
+        self.interaction_matrix = snapshot
+        self.user_ids = list(snapshot.user_ids)
+        self.product_ids = list(snapshot.product_ids)
+        print(f" Matrix shape: {snapshot.shape} (Users × Products), {snapshot.nnz} interactions")
+        print(f"   • Reading {snapshot.chunk_rows} rows per chunk")
+        
+        self._factorize(warm_start)
+        
+        self.is_trained = True
+        self.training_date = datetime.now().isoformat()
+        print(" Model training complete!")
+        
+        return self
+    
+    def _factorize(self, warm_start=None):
+        """Fit user/product factors on self.interaction_matrix with the selected engine"""
+        print(f"   • Using {self.n_factors} latent factors")
+        print("   • Factorizing user-item matrix...")
+        
+        start = time.perf_counter()
+        if self.engine == "svd":
+            self.svd_model = TruncatedSVD(n_components=self.n_factors, random_state=42)
+            self.user_factors = self.svd_model.fit_transform(self.user_item_matrix.values)
+            self.product_factors = self.svd_model.components_.T
+            explained_var = self.svd_model.explained_variance_ratio_.sum()
+            self.training_info = {"iterations": None, "warm_start": False}
+        else:
+            if warm_start is not None and not compatible_factors(warm_start.get("engine"), self.engine):
+                warm_start = None
+            if warm_start is not None:
+                warm_start = dict(
+                    warm_start,
+                    current_user_ids=self.user_ids,
+                    current_product_ids=self.product_ids
+                )
+            engine = get_engine(self.engine, n_factors=self.n_factors)
+            self.svd_model = None
+            self.user_factors, self.product_factors, info = engine.fit(
+                self.interaction_matrix, warm_start=warm_start
+            )
+            self.training_info = {"iterations": info["iterations"], "warm_start": info["warm_start"]}
+            
+            # Implicit ALS factors are not a projection of the matrix, so
+            # explained variance does not apply to them
+            explained_var = None
+            if self.engine != "als":
+                explained_var = explained_variance_ratio(self.interaction_matrix, self.user_factors)
+        self.training_info["training_seconds"] = round(time.perf_counter() - start, 4)
+        self.explained_variance = None if explained_var is None else float(explained_var)
+        
+        # Step 3: Calculate explained variance
+        if explained_var is not None:
+            print(f"   • Explained variance: {explained_var*100:.1f}%")
+            print(f"   • This means the model captures {explained_var*100:.1f}% of rating patterns")
+        print(f"   • Training time: {self.training_info['training_seconds']:.3f}s"
+              f" (iterations: {self.training_info['iterations']},"
+              f" warm start: {self.training_info['warm_start']})")
+    
+    def get_warm_start(self):
+        """
+        Return this model's ids and factors so the next training run can
+        start from them (see train(warm_start=...))
+        """
+        if not self.is_trained or self.user_factors is None:
+            return None
+        
+        return {
+            "engine": self.engine,
+            "user_ids": list(self.user_ids),
+            "product_ids": list(self.product_ids),
+            "user_factors": np.asarray(self.user_factors),
+            "product_factors": np.asarray(self.product_factors)
+        }
+    
     def predict_rating(self, user_id, product_id):
         """
         Predict rating for a user-product pair
@@ -201,27 +305,113 @@ class CollaborativeFilteringModel:
             raise ValueError("Model must be trained first!")
         
         # Handle users/products not in training data
-        if user_id not in self.user_ids:
+        user_idx = self._user_index(user_id)
+        product_idx = self._product_index(product_id)
+        if user_idx is None or product_idx is None:
             return None
-        if product_id not in self.product_ids:
-            return None
-        
-        user_idx = self.user_ids.index(user_id)
-        product_idx = self.product_ids.index(product_id)
         
         # Get latent factors
-        user_factors = self.svd_model.components_[:, user_idx]
-        product_factors = self.svd_model.components_[:, product_idx]
+        user_factors = self.user_factors[user_idx]
+        product_factors = self.product_factors[product_idx]
         
         # Predict rating (dot product of latent vectors)
         predicted = np.dot(user_factors, product_factors)
         
-        # Clip to valid rating range [1, 5]
-        predicted = np.clip(predicted, 1, 5)
+        # Map onto the valid rating range [1, 5]
+        predicted = self.scores_to_ratings(predicted)
         
-        return round(predicted, 2)
+        return round(float(predicted), 2)
     
-    def recommend_products(self, user_id, n_recommendations=5, exclude_rated=True):
+    def scores_to_ratings(self, scores):
+        """
+        Convert raw factor scores to the 1-5 rating scale
+        
+        SVD-style engines reconstruct ratings (clipped to [1, 5]); implicit ALS
+        predicts preferences in [0, 1] which are stretched onto the same scale.
+        """
+        engine = ENGINES.get(self.engine)
+        if engine is not None:
+            return engine.to_rating(scores)
+        return np.clip(scores, 1, 5)
+    
+    def _user_index(self, user_id):
+        """Row of user_id in the factor matrices, or None for unknown users"""
+        if user_id not in self.user_ids:
+            return None
+        return self.user_ids.index(user_id)
+    
+    def _product_index(self, product_id):
+        """Column of product_id in the factor matrices, or None for unknown products"""
+        if product_id not in self.product_ids:
+            return None
+        return self.product_ids.index(product_id)
+    
+    def _session_columns(self, session):
+        """Product columns and weights of the session items known to the model"""
+        columns, weights = [], []
+        for product_id, weight in session or []:
+            idx = self._product_index(product_id)
+            if idx is not None:
+                columns.append(idx)
+                weights.append(weight)
+        return np.array(columns, dtype=np.int64), np.array(weights, dtype=np.float64)
+    
+    def _user_vector(self, user_idx, session_columns, session_weights):
+        """
+        The user's stored factors blended with their recent session
+        
+        Training keeps the maximum weight per (user, product), so the session
+        is merged the same way: repeated session items collapse to their
+        maximum, and an item already in the trained row only counts where the
+        session weight is higher. SVD-style factors are linear in the
+        interaction row (u = r V), so only the projection of that increase,
+        max(w, r) - r, is added to the stored factors. Implicit ALS factors are
+        a least-squares solution, so the merged row is re-solved against the
+        product factors. Users unknown to the model are scored from their
+        session alone.
+        
+        Returns:
+            Factor vector, or None if there is nothing to score the user from
+        """
+        if len(session_columns) == 0:
+            return None if user_idx is None else self.user_factors[user_idx]
+        
+        if self._session_engine is None:
+            self._session_engine = get_engine(self.engine if self.engine in ENGINES else "subspace", self.n_factors)
+        engine = self._session_engine
+        
+        columns, inverse = np.unique(session_columns, return_inverse=True)
+        weights = np.zeros(len(columns))
+        np.maximum.at(weights, inverse, session_weights)
+        
+        row_columns = np.zeros(0, dtype=np.int64)
+        row_weights = np.zeros(0)
+        if user_idx is not None:
+            lo, hi = self.interaction_matrix.indptr[user_idx], self.interaction_matrix.indptr[user_idx + 1]
+            row_columns = np.asarray(self.interaction_matrix.indices[lo:hi], dtype=np.int64)
+            row_weights = np.asarray(self.interaction_matrix.data[lo:hi], dtype=np.float64)
+        _, in_row, in_session = np.intersect1d(row_columns, columns, assume_unique=True, return_indices=True)
+        trained = np.zeros(len(columns))
+        trained[in_session] = row_weights[in_row]
+        
+        if engine.factor_family == "implicit":
+            merged = row_weights.copy()
+            merged[in_row] = np.maximum(merged[in_row], weights[in_session])
+            new = np.ones(len(columns), dtype=bool)
+            new[in_session] = False
+            return engine.fold_in(
+                self.product_factors,
+                np.concatenate([row_columns, columns[new]]),
+                np.concatenate([merged, weights[new]])
+            )
+        
+        increase = np.maximum(weights, trained) - trained
+        projection = engine.fold_in(self.product_factors, columns, increase)
+        if user_idx is None:
+            return projection
+        return self.user_factors[user_idx] + projection
+    
+    def recommend_products(self, user_id, n_recommendations=5, exclude_rated=True, session=None):
         """
         Recommend top N products for a user
         
@@ -236,6 +426,9 @@ class CollaborativeFilteringModel:
             user_id: User to generate recommendations for
             n_recommendations: Number of products to recommend
             exclude_rated: If True, exclude products already rated by user
+            session: Optional list of (product_id, weight) of recent interactions
+                     not yet trained on; they are folded into the user's factors
+                     at request time (see _user_vector)
         
         Returns:
             List of (product_id, predicted_rating) tuples
@@ -243,36 +436,97 @@ class CollaborativeFilteringModel:
         if not self.is_trained:
             raise ValueError("Model must be trained first!")
         
-        if user_id not in self.user_ids:
+        user_idx = self._user_index(user_id)
+        session_columns, session_weights = self._session_columns(session)
+        user_vector = self._user_vector(user_idx, session_columns, session_weights)
+        if user_vector is None:
             return []
         
-        user_idx = self.user_ids.index(user_id)
-        user_ratings = self.user_item_matrix.iloc[user_idx]
-        
-        predictions = []
+        # Predict ratings for every product at once (U[u] · Vᵀ)
+        scores = self.product_factors @ user_vector
+        ratings = np.round(self.scores_to_ratings(scores), 2)
         
-        for product_id in self.product_ids:
-            # Skip if user already rated this product (if exclude_rated is True)
-            if exclude_rated and user_ratings[product_id] > 0:
-                continue
-            
-            # Predict rating
-            predicted_rating = self.predict_rating(user_id, product_id)
-            if predicted_rating is not None:
-                predictions.append((product_id, predicted_rating))
+        # Skip products the user already rated (if exclude_rated is True)
+        candidates = np.ones(len(self.product_ids), dtype=bool)
+        if exclude_rated:
+            if user_idx is not None:
+                lo, hi = self.interaction_matrix.indptr[user_idx], self.interaction_matrix.indptr[user_idx + 1]
+                rated = self.interaction_matrix.indices[lo:hi]
+                candidates[rated[self.interaction_matrix.data[lo:hi] > 0]] = False
+            candidates[session_columns] = False
         
         # If no unrated products, return top-rated products anyway
-        if len(predictions) == 0 and exclude_rated:
-            for product_id in self.product_ids:
-                predicted_rating = self.predict_rating(user_id, product_id)
-                if predicted_rating is not None:
-                    predictions.append((product_id, predicted_rating))
-        
-        # Sort by predicted rating (descending)
-        predictions.sort(key=lambda x: x[1], reverse=True)
+        if not candidates.any():
+            candidates[:] = True
+        
+        # Sort by predicted score (descending); ranking on the raw score keeps
+        # products whose rating clips to the same value in model order
+        candidate_idx = np.flatnonzero(candidates)
+        order = candidate_idx[np.argsort(-scores[candidate_idx], kind="stable")]
+        predictions = [
+            (str(self.product_ids[i]), float(ratings[i]))
+            for i in order[:n_recommendations]
+        ]
         
         return predictions[:n_recommendations]
     
+    def recommend_block(self, start, stop, n_recommendations=10, exclude_rated=True):
+        """
+        Top-N products for the users in rows [start, stop), scored together
+        
+        One (rows × products) matrix product per block instead of one
+        recommend_products() call per user; the top N are selected with
+        argpartition, so only N scores per row are sorted.
+        
+        Returns:
+            (indices, ratings): (rows × N) product columns ordered best first
+            and their predicted ratings; rows with fewer candidates than N
+            are padded with column -1
+        """
+        if not self.is_trained:
+            raise ValueError("Model must be trained first!")
+        
+        scores = np.asarray(self.user_factors[start:stop]) @ np.asarray(self.product_factors).T
+        n_rows, n_products = scores.shape
+        n = min(n_recommendations, n_products)
+        
+        if exclude_rated:
+            indptr = self.interaction_matrix.indptr
+            lo, hi = int(indptr[start]), int(indptr[stop])
+            rows = np.repeat(np.arange(n_rows), np.diff(np.asarray(indptr[start:stop + 1])))
+            rated = np.asarray(self.interaction_matrix.data[lo:hi]) > 0
+            masked = scores.copy()
+            masked[rows[rated], np.asarray(self.interaction_matrix.indices[lo:hi])[rated]] = -np.inf
+            # Users who rated everything get their top-rated products anyway
+            everything_rated = np.isneginf(masked).all(axis=1)
+            masked[everything_rated] = scores[everything_rated]
+            scores = masked
+        
+        if n == 0:
+            return np.empty((n_rows, 0), dtype=np.int64), np.empty((n_rows, 0))
+        
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        # Best score first, ties in column order (as in recommend_products)
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        
+        valid = np.isfinite(top_scores)
+        ratings = np.round(self.scores_to_ratings(np.where(valid, top_scores, 0)), 2)
+        return np.where(valid, top, -1), np.where(valid, ratings, 0.0)
+    
+    def iter_recommendations(self, n_recommendations=10, start=0, stop=None, block_size=1024):
+        """
+        Yield (first_row, indices, ratings) of recommend_block() for rows
+        [start, stop) in blocks of block_size users
+        """
+        stop = len(self.user_factors) if stop is None else stop
+        for block_start in range(start, stop, block_size):
+            block_stop = min(block_start + block_size, stop)
+            indices, ratings = self.recommend_block(block_start, block_stop, n_recommendations)
+            yield block_start, indices, ratings
+    
     def get_model_stats(self):
         """Return model statistics for reporting"""
         if not self.is_trained:
@@ -284,8 +538,12 @@ class CollaborativeFilteringModel:
             "n_users": int(len(self.user_ids)),
             "n_products": int(len(self.product_ids)),
             "n_factors": int(self.n_factors),
-            "total_interactions": int((self.user_item_matrix > 0).sum().sum()),
-            "explained_variance": float(self.svd_model.explained_variance_ratio_.sum()),
+            "total_interactions": int(self.interaction_matrix.nnz),
+            "explained_variance": None if self.explained_variance is None else float(self.explained_variance),
+            "engine": self.engine,
+            "training_seconds": self.training_info.get("training_seconds"),
+            "training_iterations": self.training_info.get("iterations"),
+            "warm_start": bool(self.training_info.get("warm_start")),
             "description": "Collaborative Filtering using Matrix Factorization (SVD)"
         }
     
@@ -302,7 +560,13 @@ class CollaborativeFilteringModel:
             'user_ids': self.user_ids,
             'product_ids': self.product_ids,
             'n_factors': self.n_factors,
-            'training_date': self.training_date
+            'training_date': self.training_date,
+            'engine': self.engine,
+            'user_factors': self.user_factors,
+            'product_factors': self.product_factors,
+            'explained_variance': self.explained_variance,
+            'training_info': self.training_info,
+            'snapshot_dir': getattr(self.interaction_matrix, 'directory', None)
         }
         
         with open(filepath, 'wb') as f:
@@ -321,9 +585,61 @@ class CollaborativeFilteringModel:
         self.product_ids = model_data['product_ids']
         self.n_factors = model_data['n_factors']
         self.training_date = model_data['training_date']
+        if self.user_item_matrix is not None:
+            self.interaction_matrix = sparse.csr_matrix(self.user_item_matrix.values, dtype=np.float64)
+        else:
+            # Trained out-of-core: re-attach the memory-mapped snapshot
+            self.interaction_matrix = MemmapCSR(model_data['snapshot_dir'])
+        self.engine = model_data.get('engine', 'svd')
+        self.training_info = model_data.get('training_info', {})
+        
+        if model_data.get('user_factors') is not None:
+            self.user_factors = model_data['user_factors']
+            self.product_factors = model_data['product_factors']
+            self.explained_variance = model_data['explained_variance']
+        else:
+            # Models saved before factors were stored: rebuild them from the SVD
+            self.user_factors = self.svd_model.transform(self.user_item_matrix.values)
+            self.product_factors = self.svd_model.components_.T
+            self.explained_variance = float(self.svd_model.explained_variance_ratio_.sum())
         self.is_trained = True
         
         print(f" Model loaded from {filepath}")
+    
+    def save_factors(self, filepath):
+        """
+        Save ids and factors to a small .npz file
+        
+        Kept next to the pickle so the next retrain can warm start even after
+        the pickle itself was deleted to force retraining.
+        """
+        if not self.is_trained:
+            raise ValueError("Cannot save untrained model!")
+        
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        np.savez(
+            filepath,
+            engine=np.array(self.engine),
+            user_ids=np.array(self.user_ids, dtype=str),
+            product_ids=np.array(self.product_ids, dtype=str),
+            user_factors=np.asarray(self.user_factors),
+            product_factors=np.asarray(self.product_factors)
+        )
+    
+    @staticmethod
+    def load_warm_start(filepath):
+        """Load factors written by save_factors() in the get_warm_start() format"""
+        if not os.path.exists(filepath):
+            return None
+        
+        with np.load(filepath) as data:
+            return {
+                "engine": str(data["engine"]) if "engine" in data else None,
+                "user_ids": data["user_ids"].tolist(),
+                "product_ids": data["product_ids"].tolist(),
+                "user_factors": data["user_factors"],
+                "product_factors": data["product_factors"]
+            }
 
 
 # Main execution
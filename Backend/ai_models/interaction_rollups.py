@@ -0,0 +1,222 @@
+"""
+Interaction Rollups - incremental compaction of raw interaction events
+
+The `interactions` collection stores every view/cart/save/purchase as its
+own document, but the CF model only needs one value per (user, product):
+the maximum weight. This job maintains a pre-aggregated collection
+
+    interaction_rollups: one document per (userId, productId)
+        weight          max weight seen (purchase > save > cart > view)
+        count           number of events
+        actions.<name>  number of events per action
+        firstTimestamp / lastTimestamp
+        lastEventId     _id of the newest event folded in
+
+so training and snapshot reads scan O(pairs) instead of O(events).
+
+Compaction is incremental: only events with an _id above the stored
+watermark are read, folded per pair in memory and applied with unordered
+bulk_write upserts ($max / $inc / $min), which are safe to combine across
+batches. Events younger than `settle_seconds` are left for the next run, so
+ObjectIds generated slightly out of order by several Node workers are not
+skipped.
+
+The watermark is stored after each batch is written. If a run dies in
+between, the next run reads the same batch again; each upsert is guarded by
+the rollup's lastEventId, so a pair that already includes the batch is left
+alone and its counts are not incremented twice (the guarded upsert then
+fails with a duplicate key, which is expected and ignored). Replays are
+no-ops as long as batch_size is unchanged, since batches are then cut at
+the same events.
+
+Usage:
+    python interaction_rollups.py [db_uri=...] [rebuild]
+"""
+
+import sys
+import json
+from datetime import datetime, timedelta
+
+ROLLUPS_COLLECTION = 'interaction_rollups'
+STATE_COLLECTION = 'interaction_rollup_state'
+STATE_ID = 'interactions'
+
+
+class InteractionRollupCompactor:
+    def __init__(self, db, batch_size=1000, settle_seconds=60):
+        """
+        Args:
+            db: pymongo (or mongomock) Database holding `interactions`
+            batch_size: Distinct pairs folded in memory before each bulk_write
+            settle_seconds: Only compact events at least this old
+        """
+        self.db = db
+        self.events = db['interactions']
+        self.rollups = db[ROLLUPS_COLLECTION]
+        self.state = db[STATE_COLLECTION]
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+
+    def ensure_indexes(self):
+        """One rollup per pair; the compound index also serves reads sorted by user"""
+        self.rollups.create_index([('userId', 1), ('productId', 1)], unique=True)
+
+    def get_watermark(self):
+        """_id of the last event folded into the rollups (None before the first run)"""
+        state = self.state.find_one({'_id': STATE_ID})
+        return state.get('lastEventId') if state else None
+
+    def _set_watermark(self, last_event_id, events_compacted):
+        self.state.update_one(
+            {'_id': STATE_ID},
+            {
+                '$set': {'lastEventId': last_event_id, 'updatedAt': datetime.utcnow()},
+                '$inc': {'eventsCompacted': events_compacted}
+            },
+            upsert=True
+        )
+
+    def _flush(self, pending):
+        """Apply the folded pairs with one unordered bulk_write"""
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        operations = []
+        for (user_id, product_id), rollup in pending.items():
+            update = {
+                '$max': {'weight': rollup['weight']},
+                '$inc': {'count': rollup['count']},
+                '$set': {'lastEventId': rollup['lastEventId']}
+            }
+            for action, count in rollup['actions'].items():
+                update['$inc'][f'actions.{action}'] = count
+            if rollup['firstTimestamp'] is not None:
+                update['$min'] = {'firstTimestamp': rollup['firstTimestamp']}
+                update['$max']['lastTimestamp'] = rollup['lastTimestamp']
+            # Only rollups that don't include this batch yet (or predate lastEventId)
+            guard = {'userId': user_id, 'productId': product_id,
+                     'lastEventId': {'$not': {'$gte': rollup['lastEventId']}}}
+            operations.append(UpdateOne(guard, update, upsert=True))
+
+        if not operations:
+            return
+        try:
+            self.rollups.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A replayed pair fails the guard, and its upsert then hits the
+            # unique (userId, productId) index: nothing to do for that pair
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+
+    def compact(self, max_events=None):
+        """
+        Fold new events into the rollups
+
+        Args:
+            max_events: Optional cap on events processed in this run
+
+        Returns:
+            Dict with the number of events read and pairs written
+        """
+        from bson import ObjectId
+
+        self.ensure_indexes()
+        watermark = self.get_watermark()
+
+        id_range = {'$lt': ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=self.settle_seconds))}
+        if watermark is not None:
+            id_range['$gt'] = watermark
+
+        cursor = self.events.find(
+            {'_id': id_range},
+            {'userId': 1, 'productId': 1, 'action': 1, 'weight': 1, 'timestamp': 1}
+        ).sort('_id', 1)
+        if max_events:
+            cursor = cursor.limit(max_events)
+
+        pending = {}
+        events_read = 0
+        events_in_batch = 0
+        pairs_written = 0
+        last_event_id = watermark
+
+        for event in cursor:
+            events_read += 1
+            events_in_batch += 1
+            last_event_id = event['_id']
+
+            user_id = event.get('userId')
+            product_id = event.get('productId')
+            weight = event.get('weight', 1)
+            if not user_id or not product_id or not weight or weight <= 0:
+                continue
+
+            rollup = pending.get((user_id, product_id))
+            if rollup is None:
+                rollup = {'weight': weight, 'count': 0, 'actions': {},
+                          'firstTimestamp': None, 'lastTimestamp': None}
+                pending[(user_id, product_id)] = rollup
+
+            rollup['lastEventId'] = event['_id']
+            rollup['weight'] = max(rollup['weight'], weight)
+            rollup['count'] += 1
+            action = event.get('action', 'view')
+            rollup['actions'][action] = rollup['actions'].get(action, 0) + 1
+
+            timestamp = event.get('timestamp')
+            if isinstance(timestamp, datetime):
+                if rollup['firstTimestamp'] is None or timestamp < rollup['firstTimestamp']:
+                    rollup['firstTimestamp'] = timestamp
+                if rollup['lastTimestamp'] is None or timestamp > rollup['lastTimestamp']:
+                    rollup['lastTimestamp'] = timestamp
+
+            if len(pending) >= self.batch_size:
+                self._flush(pending)
+                self._set_watermark(last_event_id, events_in_batch)
+                pairs_written += len(pending)
+                pending = {}
+                events_in_batch = 0
+
+        self._flush(pending)
+        pairs_written += len(pending)
+        if last_event_id is not None and last_event_id != watermark:
+            self._set_watermark(last_event_id, events_in_batch)
+
+        return {
+            'events_read': events_read,
+            'pairs_written': pairs_written,
+            'watermark': str(last_event_id) if last_event_id is not None else None
+        }
+
+    def rebuild(self):
+        """Drop the rollups and the watermark, then compact every event again"""
+        self.rollups.drop()
+        self.state.delete_one({'_id': STATE_ID})
+        return self.compact()
+
+    def has_rollups(self):
+        """True once the rollups have been built at least once"""
+        return self.get_watermark() is not None
+
+
+if __name__ == "__main__":
+    from cf_integration import CFIntegration
+
+    db_uri_arg = None
+    for arg in sys.argv:
+        if arg.startswith('db_uri='):
+            db_uri_arg = arg.split('=', 1)[1]
+
+    client, db = CFIntegration(db_uri=db_uri_arg).open_database()
+    if db is None:
+        print(json.dumps({"success": False, "error": "Could not connect to MongoDB"}))
+        sys.exit(0)
+
+    try:
+        compactor = InteractionRollupCompactor(db)
+        result = compactor.rebuild() if 'rebuild' in sys.argv[1:] else compactor.compact()
+        print(json.dumps({"success": True, **result}))
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+    finally:
+        client.close()
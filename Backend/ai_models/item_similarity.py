@@ -0,0 +1,360 @@
+"""
+Item-Item Co-occurrence Recommender ("bought together")
+
+Works alongside CollaborativeFilteringModel, but instead of latent factors it
+uses the products that appear together in the same users' histories.
+
+Step 1: Binary User × Product matrix X
+    X[u, p] = 1 if user u interacted with product p
+
+Step 2: Co-occurrence (computed in blocks of products)
+    C = Xᵀ X          C[i, j] = number of users who interacted with both i and j
+
+Step 3: Cosine similarity, keep only the top-N neighbours per product
+    S[i, j] = C[i, j] / sqrt(C[i, i] * C[j, j])
+
+Step 4: Related products for a user
+    score = Σ weight(u, p) * S[p, :]   over the user's recent products p
+    (a sparse aggregation over a few short neighbour lists)
+
+"Recent" is the live session when the caller has one (see session_buffer.py);
+otherwise the last `recent_items` products of the user's history, by
+timestamp when the interactions carry one and by weight otherwise. Only
+those are kept per user, not the whole history.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from datetime import datetime
+
+
+class ItemCooccurrenceModel:
+    def __init__(self, n_neighbors=20, block_size=2048, recent_items=10):
+        """
+        Initialize the item-item model
+
+        Args:
+            n_neighbors: Neighbours kept per product (top-N by similarity)
+            block_size: Products per block of the Xᵀ X product
+                        (bounds the memory of the intermediate co-occurrence block)
+            recent_items: Products kept per user to aggregate over
+        """
+        self.n_neighbors = n_neighbors
+        self.block_size = block_size
+        self.recent_items = recent_items
+        self.product_ids = None
+        self.user_ids = None
+        self.neighbors = None
+        self.user_history = None
+        self.product_index = {}
+        self.user_index = {}
+        self.is_trained = False
+        self.training_date = None
+
+    def _top_neighbors(self, block, offset, norms):
+        """
+        Turn one co-occurrence block into top-N cosine neighbour lists
+
+        Returns:
+            List of (indices, similarities) per row of the block
+        """
+        block = block.tocsr()
+        rows = []
+        for r in range(block.shape[0]):
+            item = offset + r
+            lo, hi = block.indptr[r], block.indptr[r + 1]
+            cols = block.indices[lo:hi]
+            counts = block.data[lo:hi]
+
+            keep = cols != item
+            cols, counts = cols[keep], counts[keep]
+            similarity = counts / (norms[item] * norms[cols])
+
+            # Best first, ties by product column, so the lists don't depend on
+            # how the block was assembled (in memory or streamed from a snapshot)
+            order = np.lexsort((cols, -similarity))[:self.n_neighbors]
+            rows.append((cols[order], similarity[order]))
+        return rows
+
+    def _build_neighbors(self, cooccurrence_blocks, n_products, norms):
+        """
+        Top-N neighbour CSR from the co-occurrence blocks
+
+        Args:
+            cooccurrence_blocks: Yields (start, block) with block = rows
+                                 [start, start + len) of Xᵀ X
+        """
+        indptr = [0]
+        indices = []
+        data = []
+        for start, block in cooccurrence_blocks:
+            for cols, similarity in self._top_neighbors(block, start, norms):
+                indices.append(cols)
+                data.append(similarity)
+                indptr.append(indptr[-1] + len(cols))
+
+        self.neighbors = sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.array([]),
+                np.concatenate(indices) if indices else np.array([], dtype=np.int32),
+                np.array(indptr)
+            ),
+            shape=(n_products, n_products)
+        )
+
+        self.is_trained = True
+        self.training_date = datetime.now().isoformat()
+        print(f" Item-item model ready ({self.neighbors.nnz} neighbour links)")
+
+    def _set_ids(self, user_ids, product_ids):
+        self.user_ids = [str(user_id) for user_id in user_ids]
+        self.product_ids = [str(product_id) for product_id in product_ids]
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.product_index = {product_id: i for i, product_id in enumerate(self.product_ids)}
+
+    def train(self, interactions_df):
+        """
+        Build the top-N neighbour lists from interactions
+
+        Args:
+            interactions_df: DataFrame with columns user_id, product_id, rating
+                             and optionally timestamp (orders each user's recent items)
+        """
+        print("\n Building Item-Item Co-occurrence Model...")
+
+        users = pd.Categorical(interactions_df['user_id'])
+        products = pd.Categorical(interactions_df['product_id'])
+        self._set_ids(users.categories.astype(str), products.categories.astype(str))
+
+        shape = (len(self.user_ids), len(self.product_ids))
+        binary = sparse.coo_matrix(
+            (np.ones(len(interactions_df)), (users.codes, products.codes)), shape=shape
+        ).tocsr()
+        binary.data[:] = 1.0
+        binary_t = binary.T.tocsr()
+        norms = np.sqrt(np.asarray(binary.sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+
+        # Each user's last `recent_items` products (newest first) for aggregation later
+        recent = pd.DataFrame({
+            'user': users.codes,
+            'product': products.codes,
+            'weight': interactions_df['rating'].to_numpy(dtype=np.float64),
+            'timestamp': pd.to_datetime(interactions_df['timestamp']).to_numpy() if 'timestamp' in interactions_df
+                         else np.zeros(len(interactions_df))
+        })
+        recent = recent.sort_values(['user', 'timestamp', 'weight'], ascending=[True, False, False],
+                                    na_position='last', kind='stable')
+        recent = recent.drop_duplicates(['user', 'product']).groupby('user', sort=False).head(self.recent_items)
+        self.user_history = sparse.csr_matrix(
+            (recent['weight'].to_numpy(), (recent['user'].to_numpy(), recent['product'].to_numpy())), shape=shape
+        )
+
+        print(f"   • Products: {shape[1]}, Users: {shape[0]}, Interactions: {binary.nnz}")
+        print(f"   • Keeping top {self.n_neighbors} neighbours per product")
+
+        # Co-occurrence of each block of products with every product
+        blocks = (
+            (start, binary_t[start:start + self.block_size] @ binary)
+            for start in range(0, shape[1], self.block_size)
+        )
+        self._build_neighbors(blocks, shape[1], norms)
+
+        return self
+
+    def train_from_snapshot(self, snapshot):
+        """
+        Build the neighbour lists from a memory-mapped snapshot (matrix_snapshot.MemmapCSR)
+
+        Streams the rows: one pass for the product counts and each user's
+        strongest `recent_items` products (snapshots carry no timestamps), then
+        one pass per block of block_size products for its co-occurrence rows.
+        """
+        print("\n Building Item-Item Co-occurrence Model from snapshot...")
+
+        self._set_ids(snapshot.user_ids, snapshot.product_ids)
+        n_users, n_products = snapshot.shape
+
+        counts = np.zeros(n_products)
+        history_indptr = [0]
+        history_indices = []
+        history_data = []
+        for _, chunk in snapshot.iter_row_chunks():
+            counts += np.bincount(chunk.indices, minlength=n_products)
+            for r in range(chunk.shape[0]):
+                lo, hi = chunk.indptr[r], chunk.indptr[r + 1]
+                top = np.argsort(-chunk.data[lo:hi], kind="stable")[:self.recent_items]
+                history_indices.append(chunk.indices[lo:hi][top])
+                history_data.append(chunk.data[lo:hi][top])
+                history_indptr.append(history_indptr[-1] + len(top))
+        self.user_history = sparse.csr_matrix(
+            (
+                np.concatenate(history_data) if history_data else np.array([]),
+                np.concatenate(history_indices) if history_indices else np.array([], dtype=np.int32),
+                np.array(history_indptr)
+            ),
+            shape=(n_users, n_products)
+        )
+        norms = np.sqrt(counts)
+        norms[norms == 0] = 1.0
+
+        print(f"   • Products: {n_products}, Users: {n_users}, Interactions: {snapshot.nnz}")
+        print(f"   • Keeping top {self.n_neighbors} neighbours per product")
+
+        def blocks():
+            for start in range(0, n_products, self.block_size):
+                stop = min(start + self.block_size, n_products)
+                block = sparse.csr_matrix((stop - start, n_products))
+                for _, chunk in snapshot.iter_row_chunks():
+                    binary = sparse.csr_matrix((np.ones(len(chunk.data)), chunk.indices, chunk.indptr),
+                                               shape=chunk.shape)
+                    block = block + binary[:, start:stop].T @ binary
+                yield start, block
+
+        self._build_neighbors(blocks(), n_products, norms)
+
+        return self
+
+    def related_products(self, product_ids, n_recommendations=5, weights=None, exclude=None):
+        """
+        Products bought together with the given products
+
+        Args:
+            product_ids: Products to start from (e.g. the user's recent items or cart)
+            n_recommendations: Number of products to return
+            weights: Optional weight per product (default 1 each)
+            exclude: Optional product ids to leave out (the inputs are always left out)
+
+        Returns:
+            List of (product_id, score) tuples
+        """
+        if not self.is_trained:
+            raise ValueError("Model must be trained first!")
+
+        if weights is None:
+            weights = [1.0] * len(product_ids)
+
+        source = []
+        source_weights = []
+        for product_id, weight in zip(product_ids, weights):
+            idx = self.product_index.get(product_id)
+            if idx is not None:
+                source.append(idx)
+                source_weights.append(weight)
+        return self._aggregate(np.array(source, dtype=np.int64), np.array(source_weights, dtype=np.float64),
+                               n_recommendations, exclude)
+
+    def related_for_user(self, user_id, n_recommendations=5, recent=None):
+        """
+        Related products for a user, aggregated over their recent products
+
+        Args:
+            recent: Optional (product_id, weight) list of the live session;
+                    otherwise the recent products kept from training are used
+
+        Returns:
+            List of (product_id, score) tuples ([] for users with no known products)
+        """
+        if not self.is_trained:
+            raise ValueError("Model must be trained first!")
+
+        if recent:
+            product_ids = [product_id for product_id, _ in recent]
+            related = self.related_products(product_ids, n_recommendations,
+                                            weights=[weight for _, weight in recent])
+            if related:
+                return related
+
+        user_idx = self.user_index.get(user_id)
+        if user_idx is None:
+            return []
+
+        lo, hi = self.user_history.indptr[user_idx], self.user_history.indptr[user_idx + 1]
+        return self._aggregate(self.user_history.indices[lo:hi], self.user_history.data[lo:hi], n_recommendations)
+
+    def _aggregate(self, source, source_weights, n_recommendations, exclude=None):
+        """Weighted sum of the neighbour lists of the source products"""
+        if len(source) == 0:
+            return []
+
+        indptr, indices, data = self.neighbors.indptr, self.neighbors.indices, self.neighbors.data
+        candidate_idx = np.concatenate([indices[indptr[i]:indptr[i + 1]] for i in source])
+        candidate_scores = np.concatenate([
+            data[indptr[i]:indptr[i + 1]] * w for i, w in zip(source, source_weights)
+        ])
+        if len(candidate_idx) == 0:
+            return []
+
+        unique_idx, inverse = np.unique(candidate_idx, return_inverse=True)
+        scores = np.bincount(inverse, weights=candidate_scores)
+
+        keep = ~np.isin(unique_idx, source)
+        if exclude:
+            excluded = [self.product_index[p] for p in exclude if p in self.product_index]
+            keep &= ~np.isin(unique_idx, excluded)
+        unique_idx, scores = unique_idx[keep], scores[keep]
+
+        order = np.argsort(-scores, kind="stable")[:n_recommendations]
+        return [(self.product_ids[unique_idx[i]], round(float(scores[i]), 4)) for i in order]
+
+    def get_model_stats(self):
+        """Return model statistics for reporting"""
+        if not self.is_trained:
+            return {"status": "not_trained"}
+
+        return {
+            "status": "trained",
+            "training_date": self.training_date,
+            "n_users": len(self.user_ids),
+            "n_products": len(self.product_ids),
+            "n_neighbors": self.n_neighbors,
+            "neighbor_links": int(self.neighbors.nnz),
+            "description": "Item-item co-occurrence (cosine) with top-N neighbours"
+        }
+
+    def save_model(self, filepath):
+        """Save neighbour lists and users' recent products to a .npz file"""
+        if not self.is_trained:
+            raise ValueError("Cannot save untrained model!")
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        np.savez(
+            filepath,
+            product_ids=np.array(self.product_ids, dtype=str),
+            user_ids=np.array(self.user_ids, dtype=str),
+            neighbors_indptr=self.neighbors.indptr,
+            neighbors_indices=self.neighbors.indices,
+            neighbors_data=self.neighbors.data,
+            history_indptr=self.user_history.indptr,
+            history_indices=self.user_history.indices,
+            history_data=self.user_history.data,
+            n_neighbors=np.array(self.n_neighbors),
+            recent_items=np.array(self.recent_items),
+            training_date=np.array(self.training_date)
+        )
+        print(f" Item-item model saved to {filepath}")
+
+    def load_model(self, filepath):
+        """Load a model written by save_model()"""
+        with np.load(filepath) as data:
+            self.product_ids = data["product_ids"].tolist()
+            self.user_ids = data["user_ids"].tolist()
+            n_products, n_users = len(self.product_ids), len(self.user_ids)
+            self.neighbors = sparse.csr_matrix(
+                (data["neighbors_data"], data["neighbors_indices"], data["neighbors_indptr"]),
+                shape=(n_products, n_products)
+            )
+            self.user_history = sparse.csr_matrix(
+                (data["history_data"], data["history_indices"], data["history_indptr"]),
+                shape=(n_users, n_products)
+            )
+            self.n_neighbors = int(data["n_neighbors"])
+            if "recent_items" in data:
+                self.recent_items = int(data["recent_items"])
+            self.training_date = str(data["training_date"])
+
+        self._set_ids(self.user_ids, self.product_ids)
+        self.is_trained = True
+        print(f" Item-item model loaded from {filepath}")
@@ -0,0 +1,280 @@
+"""
+Disk-backed User × Product matrix snapshots
+
+A snapshot is a directory holding the matrix in CSR form as raw binary files:
+
+    indptr.bin    int64   (n_users + 1)   row offsets
+    indices.bin   int32   (nnz)           product index of each entry
+    data.bin      float32 (nnz)           interaction weight of each entry
+    user_ids.json / product_ids.json      row / column ids
+    snapshot.json                         shape, nnz, dtypes, creation date
+
+The files are opened with np.memmap, so the operating system pages them in
+on demand. Training walks the rows in fixed-size chunks; memory use is
+bounded by the chunk and the factor blocks, not by the number of
+interactions.
+
+Snapshots exported for training are versioned under a root directory:
+
+    cf_snapshot/v<milliseconds>/   one complete snapshot per export
+
+A saved model records the path of the snapshot it was trained on, so a new
+export never touches files an older model still reads. Versions are pruned
+(prune_snapshots) only once the model trained on the new one is saved.
+"""
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+from scipy import sparse
+from datetime import datetime
+
+INDPTR_DTYPE = np.int64
+INDICES_DTYPE = np.int32
+DATA_DTYPE = np.float32
+
+
+def _write_metadata(directory, shape, nnz, user_ids, product_ids):
+    """Write the id tables and snapshot.json next to the binary arrays"""
+    with open(os.path.join(directory, 'user_ids.json'), 'w') as f:
+        json.dump([str(user_id) for user_id in user_ids], f)
+    with open(os.path.join(directory, 'product_ids.json'), 'w') as f:
+        json.dump([str(product_id) for product_id in product_ids], f)
+    with open(os.path.join(directory, 'snapshot.json'), 'w') as f:
+        json.dump({
+            "shape": [int(shape[0]), int(shape[1])],
+            "nnz": int(nnz),
+            "indptr_dtype": np.dtype(INDPTR_DTYPE).name,
+            "indices_dtype": np.dtype(INDICES_DTYPE).name,
+            "data_dtype": np.dtype(DATA_DTYPE).name,
+            "created": datetime.now().isoformat()
+        }, f)
+
+
+class SnapshotWriter:
+    """
+    Stream rows into a new snapshot, one user at a time
+
+    Rows must be written in the order the users should appear (e.g. reading
+    interactions sorted by userId). Only the row offsets and the product id
+    table are kept in memory; the entries go straight to disk.
+    """
+
+    def __init__(self, directory, product_ids=None):
+        """
+        Args:
+            directory: Snapshot directory (created if missing)
+            product_ids: Optional fixed column order; otherwise columns are
+                         assigned in order of first appearance
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.user_ids = []
+        self.product_ids = list(product_ids) if product_ids is not None else []
+        self.product_index = {product_id: i for i, product_id in enumerate(self.product_ids)}
+        self.indptr = [0]
+        self._indices_file = open(os.path.join(directory, 'indices.bin'), 'wb')
+        self._data_file = open(os.path.join(directory, 'data.bin'), 'wb')
+
+    def add_row(self, user_id, product_ids, weights):
+        """Append one user's row (duplicate products keep their max weight)"""
+        row = {}
+        for product_id, weight in zip(product_ids, weights):
+            idx = self.product_index.get(product_id)
+            if idx is None:
+                idx = len(self.product_ids)
+                self.product_ids.append(product_id)
+                self.product_index[product_id] = idx
+            row[idx] = max(weight, row.get(idx, weight))
+
+        columns = np.array(sorted(row), dtype=INDICES_DTYPE)
+        values = np.array([row[c] for c in columns], dtype=DATA_DTYPE)
+        columns.tofile(self._indices_file)
+        values.tofile(self._data_file)
+
+        self.user_ids.append(user_id)
+        self.indptr.append(self.indptr[-1] + len(columns))
+
+    def close(self):
+        """Finish the snapshot and return it opened as a MemmapCSR"""
+        self._indices_file.close()
+        self._data_file.close()
+        np.array(self.indptr, dtype=INDPTR_DTYPE).tofile(os.path.join(self.directory, 'indptr.bin'))
+
+        _write_metadata(self.directory, (len(self.user_ids), len(self.product_ids)),
+                        self.indptr[-1], self.user_ids, self.product_ids)
+
+        return MemmapCSR(self.directory)
+
+
+def write_csr(directory, matrix, user_ids, product_ids):
+    """
+    Write an existing CSR matrix (scipy or MemmapCSR) in snapshot format
+
+    Returns:
+        The snapshot opened as a MemmapCSR
+    """
+    os.makedirs(directory, exist_ok=True)
+    np.asarray(matrix.indptr, dtype=INDPTR_DTYPE).tofile(os.path.join(directory, 'indptr.bin'))
+    np.asarray(matrix.indices, dtype=INDICES_DTYPE).tofile(os.path.join(directory, 'indices.bin'))
+    np.asarray(matrix.data, dtype=DATA_DTYPE).tofile(os.path.join(directory, 'data.bin'))
+
+    _write_metadata(directory, matrix.shape, matrix.indptr[-1], user_ids, product_ids)
+
+    return MemmapCSR(directory)
+
+
+def write_snapshot(directory, interactions_df):
+    """
+    Write a snapshot from an interactions DataFrame (user_id, product_id, rating)
+
+    Convenience for data that still fits in memory; large histories should be
+    streamed through SnapshotWriter instead.
+    """
+    df = interactions_df.sort_values(['user_id', 'product_id'])
+    writer = SnapshotWriter(directory, product_ids=sorted(df['product_id'].astype(str).unique()))
+    for user_id, rows in df.groupby('user_id', sort=True):
+        writer.add_row(str(user_id), rows['product_id'].astype(str).tolist(), rows['rating'].tolist())
+    return writer.close()
+
+
+def link_snapshot(source_dir, directory):
+    """
+    Make `directory` a copy of the snapshot in source_dir without copying data
+
+    Snapshot files are never modified after they are written, so hard links
+    are safe and cost no space; the data stays on disk until the last link is
+    removed, whichever directory is pruned first. Falls back to a copy where
+    hard links aren't supported (e.g. across file systems).
+
+    Returns:
+        The new snapshot opened as a MemmapCSR
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in ('indptr.bin', 'indices.bin', 'data.bin', 'user_ids.json', 'product_ids.json', 'snapshot.json'):
+        source = os.path.join(source_dir, name)
+        if not os.path.exists(source):
+            continue
+        try:
+            os.link(source, os.path.join(directory, name))
+        except OSError:
+            shutil.copyfile(source, os.path.join(directory, name))
+    return MemmapCSR(directory)
+
+
+def new_snapshot_directory(root_dir):
+    """Path of a new, not yet existing snapshot version under root_dir"""
+    version = int(time.time() * 1000)
+    while os.path.exists(os.path.join(root_dir, f"v{version}")):
+        version += 1
+    return os.path.join(root_dir, f"v{version}")
+
+
+def prune_snapshots(root_dir, keep):
+    """
+    Remove every snapshot version under root_dir except `keep`
+
+    Also removes leftover .tmp exports and the files of an unversioned
+    snapshot written directly into root_dir by older releases.
+
+    Returns:
+        Number of versions removed
+    """
+    if not os.path.isdir(root_dir):
+        return 0
+    keep = os.path.abspath(keep) if keep else None
+    removed = 0
+    for name in os.listdir(root_dir):
+        path = os.path.join(root_dir, name)
+        if os.path.isdir(path) and name.startswith('v') and os.path.abspath(path) != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        elif name in ('indptr.bin', 'indices.bin', 'data.bin', 'user_ids.json',
+                      'product_ids.json', 'snapshot.json') and os.path.abspath(root_dir) != keep:
+            os.remove(path)
+    return removed
+
+
+class MemmapCSR:
+    """
+    Read-only, memory-mapped CSR matrix processed in row chunks
+
+    Provides the operations the subspace iteration engine needs:
+    matrix @ block, matrix.T @ block and per-column moments, each as one
+    streaming pass over the rows.
+    """
+
+    def __init__(self, directory, chunk_rows=50000, load_ids=True):
+        """
+        Args:
+            directory: Snapshot directory written by SnapshotWriter
+            chunk_rows: Rows per chunk (bounds the memory of each pass)
+            load_ids: Read the id tables (skip when the caller has its own)
+        """
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.user_ids = None
+        self.product_ids = None
+
+        with open(os.path.join(directory, 'snapshot.json'), 'r') as f:
+            meta = json.load(f)
+        if load_ids:
+            with open(os.path.join(directory, 'user_ids.json'), 'r') as f:
+                self.user_ids = json.load(f)
+            with open(os.path.join(directory, 'product_ids.json'), 'r') as f:
+                self.product_ids = json.load(f)
+
+        self.shape = tuple(meta["shape"])
+        self.nnz = int(meta["nnz"])
+        self.created = meta.get("created")
+        self.indptr = self._open('indptr.bin', meta["indptr_dtype"], self.shape[0] + 1)
+        self.indices = self._open('indices.bin', meta["indices_dtype"], self.nnz)
+        self.data = self._open('data.bin', meta["data_dtype"], self.nnz)
+
+    def _open(self, name, dtype, length):
+        """Memory-map one of the snapshot arrays (empty arrays can't be mapped)"""
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, name), dtype=dtype, mode='r', shape=(length,))
+
+    def iter_row_chunks(self):
+        """Yield (start_row, csr_chunk) for consecutive blocks of chunk_rows rows"""
+        n_rows, n_cols = self.shape
+        for start in range(0, n_rows, self.chunk_rows):
+            stop = min(start + self.chunk_rows, n_rows)
+            lo, hi = int(self.indptr[start]), int(self.indptr[stop])
+            chunk = sparse.csr_matrix(
+                (
+                    np.asarray(self.data[lo:hi], dtype=np.float64),
+                    np.asarray(self.indices[lo:hi]),
+                    np.asarray(self.indptr[start:stop + 1]) - lo
+                ),
+                shape=(stop - start, n_cols)
+            )
+            yield start, chunk
+
+    def dot(self, block):
+        """matrix @ block (n_users × l), one pass over the rows"""
+        out = np.zeros((self.shape[0], block.shape[1]))
+        for start, chunk in self.iter_row_chunks():
+            out[start:start + chunk.shape[0]] = chunk @ block
+        return out
+
+    def rdot(self, block):
+        """matrix.T @ block (n_products × l), one pass over the rows"""
+        out = np.zeros((self.shape[1], block.shape[1]))
+        for start, chunk in self.iter_row_chunks():
+            out += chunk.T @ block[start:start + chunk.shape[0]]
+        return out
+
+    def column_moments(self):
+        """Per-column mean and mean of squares, one pass over the rows"""
+        total = np.zeros(self.shape[1])
+        total_sq = np.zeros(self.shape[1])
+        for _, chunk in self.iter_row_chunks():
+            total += np.asarray(chunk.sum(axis=0)).ravel()
+            total_sq += np.asarray(chunk.multiply(chunk).sum(axis=0)).ravel()
+        n_rows = max(self.shape[0], 1)
+        return total / n_rows, total_sq / n_rows
@@ -0,0 +1,178 @@
+"""
+Parallel Precompute - top-K recommendations for every user on a process pool
+
+Scoring every user against every product is one (users × products) matrix
+product, split here into shards of consecutive user rows:
+
+    shard i = rows [start_i, stop_i) → worker → (top products, ratings)
+
+Each worker attaches to the published shared model once, in its pool
+initializer (see shared_model.py): the factors are memory-mapped, so all
+workers read the same page-cache pages and the model is never pickled. A
+task is only a (start, stop) pair, and its result is the small
+(rows × K) table of the shard. Inside a shard, users are scored in blocks
+with CollaborativeFilteringModel.recommend_block (one matrix product and an
+argpartition per block), and each worker is limited to one BLAS thread so
+the processes don't oversubscribe the cores.
+
+Shard results are merged, in whatever order they finish, into the result
+table in the version directory:
+
+    top_products.npy   (n_users × K) int32   product columns, best first (-1 = none)
+    top_ratings.npy    (n_users × K) float32 predicted ratings
+
+Usage:
+    python parallel_precompute.py [workers=N] [top_k=10]
+"""
+
+import os
+import sys
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from shared_model import SharedModel, SharedModelReader
+
+# Default pool size cap: the pool may run next to the web server, so it
+# doesn't take every core unless asked to (n_workers / workers=N)
+MAX_DEFAULT_WORKERS = 4
+
+_worker_model = None
+
+
+def _init_worker(version_dir):
+    """Pool initializer: attach to the shared model once per worker process"""
+    global _worker_model
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    _worker_model = SharedModel(version_dir)
+
+
+def _score_shard(start, stop, n_recommendations, block_size):
+    """Top-K table of user rows [start, stop) (runs in a worker)"""
+    return _score_rows(_worker_model, start, stop, n_recommendations, block_size)
+
+
+def _score_rows(model, start, stop, n_recommendations, block_size):
+    indices = []
+    ratings = []
+    for _, block_indices, block_ratings in model.iter_recommendations(n_recommendations, start, stop, block_size):
+        indices.append(block_indices.astype(np.int32))
+        ratings.append(block_ratings.astype(np.float32))
+    return start, np.concatenate(indices), np.concatenate(ratings)
+
+
+def _report(progress, done, total, started):
+    """One progress line: users done, percentage, elapsed and estimated time left"""
+    if not progress:
+        return
+    elapsed = time.perf_counter() - started
+    remaining = elapsed / done * (total - done) if done else 0
+    progress.write(
+        f"   Precompute: {done}/{total} users ({100 * done / max(total, 1):.0f}%), "
+        f"{elapsed:.1f}s elapsed, ~{remaining:.1f}s left\n"
+    )
+    progress.flush()
+
+
+def precompute_recommendations(version_dir, n_recommendations=10, n_workers=None,
+                               shard_size=None, block_size=1024, progress=None):
+    """
+    Score every user of a published model version in parallel
+
+    Args:
+        version_dir: Shared model version directory (see publish_model)
+        n_recommendations: K, the length of each user's list
+        n_workers: Worker processes (default: number of CPUs, at most MAX_DEFAULT_WORKERS)
+        shard_size: Users per task (default: about 4 shards per worker,
+                    a multiple of block_size)
+        block_size: Users scored per matrix product inside a shard
+        progress: Stream for progress lines (default: sys.stderr as of the
+                  call, so a redirected stderr is honoured; False = silent)
+
+    Returns:
+        (top_products, top_ratings): the memory-mapped result table
+    """
+    model = SharedModel(version_dir)
+    n_users = len(model.user_factors)
+    n = min(n_recommendations, len(model.product_ids))
+
+    n_workers = n_workers or min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+    if progress is None:
+        progress = sys.stderr
+    if shard_size is None:
+        shards_wanted = n_workers * 4
+        shard_size = -(-n_users // shards_wanted)
+        shard_size = max(block_size, -(-shard_size // block_size) * block_size)
+    shards = [(start, min(start + shard_size, n_users)) for start in range(0, n_users, shard_size)]
+    n_workers = max(1, min(n_workers, len(shards)))
+
+    products_path = os.path.join(version_dir, 'top_products.npy')
+    ratings_path = os.path.join(version_dir, 'top_ratings.npy')
+    top_products = np.lib.format.open_memmap(products_path + '.tmp', mode='w+', dtype=np.int32, shape=(n_users, n))
+    top_ratings = np.lib.format.open_memmap(ratings_path + '.tmp', mode='w+', dtype=np.float32, shape=(n_users, n))
+
+    started = time.perf_counter()
+    done = 0
+    if progress:
+        progress.write(f"   Precompute: {n_users} users × {len(model.product_ids)} products, "
+                       f"{len(shards)} shards on {n_workers} worker(s)\n")
+
+    def merge(start, indices, ratings):
+        top_products[start:start + len(indices)] = indices
+        top_ratings[start:start + len(ratings)] = ratings
+
+    if n_workers == 1:
+        # Not worth a pool: score in this process
+        for start, stop in shards:
+            merge(*_score_rows(model, start, stop, n, block_size))
+            done += stop - start
+            _report(progress, done, n_users, started)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(version_dir,)) as pool:
+            futures = {
+                pool.submit(_score_shard, start, stop, n, block_size): stop - start
+                for start, stop in shards
+            }
+            for future in as_completed(futures):
+                merge(*future.result())
+                done += futures[future]
+                _report(progress, done, n_users, started)
+
+    top_products.flush()
+    top_ratings.flush()
+    del top_products, top_ratings
+    os.replace(products_path + '.tmp', products_path)
+    os.replace(ratings_path + '.tmp', ratings_path)
+
+    return np.load(products_path, mmap_mode='r'), np.load(ratings_path, mmap_mode='r')
+
+
+if __name__ == "__main__":
+    n_workers = None
+    top_k = 10
+    for arg in sys.argv:
+        if arg.startswith('workers='):
+            n_workers = int(arg.split('=', 1)[1])
+        elif arg.startswith('top_k='):
+            top_k = int(arg.split('=', 1)[1])
+
+    reader = SharedModelReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shared_model'))
+    version = reader.current_version()
+    if version is None:
+        print(json.dumps({"success": False, "error": "No shared model published yet."}))
+        sys.exit(0)
+
+    started = time.perf_counter()
+    top_products, _ = precompute_recommendations(os.path.join(reader.root_dir, version), top_k, n_workers)
+    print(json.dumps({
+        "success": True,
+        "version": version,
+        "users": int(top_products.shape[0]),
+        "top_k": int(top_products.shape[1]),
+        "seconds": round(time.perf_counter() - started, 4)
+    }))
@@ -0,0 +1,168 @@
+"""
+Recommendation Store - materialized top-K lists in MongoDB
+
+After training, every user's top-K list is written to the `recommendations`
+collection (one document per user), so Node can answer
+/recommendations/:userId with a single indexed read:
+
+    recommendations: one document per userId
+        recommendations   [{productId, predictedRating}] best first
+        digest            hash of the ordered product ids
+        modelVersion      model version that last changed the list
+        updatedAt
+        lastInteractionAt set by Node on each tracked interaction (never
+                          written here); later than updatedAt = list is stale
+
+Publishing only writes what changed: the digests already stored are read
+with a projection, each new list is hashed, and only users whose digest
+differs are upserted. Unchanged lists keep their (slightly older) predicted
+ratings. Writes go out as unordered bulk_write batches, throttled to
+`max_writes_per_second` so a full publish doesn't saturate the cluster.
+
+Usage:
+    python recommendation_store.py [db_uri=...] [top_k=10]
+"""
+
+import sys
+import json
+import time
+import hashlib
+from datetime import datetime
+
+RECOMMENDATIONS_COLLECTION = 'recommendations'
+
+
+class RecommendationPublisher:
+    def __init__(self, db, batch_size=500, max_writes_per_second=1000):
+        """
+        Args:
+            db: pymongo (or mongomock) Database
+            batch_size: Upserts per bulk_write
+            max_writes_per_second: Upper bound on the write rate (None = unthrottled)
+        """
+        self.db = db
+        self.collection = db[RECOMMENDATIONS_COLLECTION]
+        self.batch_size = batch_size
+        self.max_writes_per_second = max_writes_per_second
+        self._next_write = 0.0
+
+    def ensure_indexes(self):
+        """One document per user"""
+        self.collection.create_index([('userId', 1)], unique=True)
+
+    def published_digests(self):
+        """Digest of every stored list, by userId"""
+        return {
+            doc['userId']: doc.get('digest')
+            for doc in self.collection.find({}, {'userId': 1, 'digest': 1, '_id': 0})
+        }
+
+    @staticmethod
+    def digest(product_ids):
+        """Short hash of an ordered list of product ids"""
+        return hashlib.sha1(json.dumps(product_ids).encode('utf-8')).hexdigest()[:16]
+
+    def _flush(self, operations):
+        """Apply one batch with an unordered bulk_write, respecting the write rate"""
+        if not operations:
+            return
+
+        if self.max_writes_per_second:
+            wait = self._next_write - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+        self.collection.bulk_write(operations, ordered=False)
+
+        if self.max_writes_per_second:
+            self._next_write = max(self._next_write, time.monotonic()) + len(operations) / self.max_writes_per_second
+
+    def publish(self, model, model_version=None, n_recommendations=10, block_size=1024, blocks=None):
+        """
+        Write the top-N list of every user whose list changed
+
+        Args:
+            model: Trained CollaborativeFilteringModel (or SharedModel)
+            model_version: Recorded on the documents that are written
+            n_recommendations: Length of each stored list
+            block_size: Users scored per block (see recommend_block)
+            blocks: Optional precomputed (first_row, indices, ratings) blocks,
+                    e.g. the table of parallel_precompute; scored here otherwise
+
+        Returns:
+            Dict with the number of users scored, written and unchanged
+        """
+        from pymongo import UpdateOne
+
+        self.ensure_indexes()
+        published = self.published_digests()
+        user_ids = model.user_ids
+        product_ids = model.product_ids
+
+        operations = []
+        written = 0
+        unchanged = 0
+        now = datetime.utcnow()
+
+        if blocks is None:
+            blocks = model.iter_recommendations(n_recommendations, block_size=block_size)
+
+        for start, indices, ratings in blocks:
+            for offset in range(len(indices)):
+                user_id = str(user_ids[start + offset])
+                valid = indices[offset] >= 0
+                recommended = [str(product_ids[i]) for i in indices[offset][valid]]
+
+                digest = self.digest(recommended)
+                if published.get(user_id) == digest:
+                    unchanged += 1
+                    continue
+
+                operations.append(UpdateOne(
+                    {'userId': user_id},
+                    {'$set': {
+                        'recommendations': [
+                            {'productId': product_id, 'predictedRating': round(float(rating), 2)}
+                            for product_id, rating in zip(recommended, ratings[offset][valid])
+                        ],
+                        'digest': digest,
+                        'modelVersion': model_version,
+                        'updatedAt': now
+                    }},
+                    upsert=True
+                ))
+                if len(operations) >= self.batch_size:
+                    self._flush(operations)
+                    written += len(operations)
+                    operations = []
+
+        self._flush(operations)
+        written += len(operations)
+
+        return {
+            'users': written + unchanged,
+            'written': written,
+            'unchanged': unchanged,
+            'model_version': model_version
+        }
+
+
+if __name__ == "__main__":
+    from cf_integration import CFIntegration
+
+    db_uri_arg = None
+    top_k = 10
+    for arg in sys.argv:
+        if arg.startswith('db_uri='):
+            db_uri_arg = arg.split('=', 1)[1]
+        elif arg.startswith('top_k='):
+            top_k = int(arg.split('=', 1)[1])
+
+    try:
+        result = CFIntegration(db_uri=db_uri_arg).materialize_recommendations(top_k)
+        if result is None:
+            print(json.dumps({"success": False, "error": "No published model or no MongoDB connection"}))
+        else:
+            print(json.dumps({"success": True, **result}))
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
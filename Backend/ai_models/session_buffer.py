@@ -0,0 +1,96 @@
+"""
+Session Buffer - recent interactions of active users, kept in memory
+
+Training only sees interactions up to the last run. Between runs, the
+serving process keeps each active user's most recent interactions in a
+small ring buffer:
+
+    sessions: user_id → deque(maxlen=capacity) of (product_id, weight, time)
+
+At request time the buffered items are handed to
+CollaborativeFilteringModel.recommend_products(session=...), which folds them
+into the user's factors. Events buffered before the serving model's data
+cutoff are already part of its training data and are dropped (recent(since=)),
+so a retrain doesn't count them twice. Older events count less (weight halves every
+`half_life_seconds`), events older than `ttl_seconds` are dropped, and the
+least recently active users are evicted once `max_users` is reached, so
+memory is bounded by max_users × capacity entries.
+
+The buffer lives in a long-running process (`python cf_integration.py serve`);
+the events themselves are already persisted in MongoDB by Node and reach the
+model at the next training run.
+"""
+
+import time
+from collections import OrderedDict, deque
+
+
+class SessionBuffer:
+    def __init__(self, capacity=20, max_users=10000, half_life_seconds=600, ttl_seconds=1800):
+        """
+        Args:
+            capacity: Recent interactions kept per user (ring buffer size)
+            max_users: Active users kept; the least recently active are evicted
+            half_life_seconds: Age at which an interaction counts half
+            ttl_seconds: Interactions older than this are dropped
+        """
+        self.capacity = capacity
+        self.max_users = max_users
+        self.half_life_seconds = half_life_seconds
+        self.ttl_seconds = ttl_seconds
+        self.sessions = OrderedDict()
+
+    def ingest(self, user_id, product_id, weight=1.0, timestamp=None):
+        """Record one interaction (the oldest of the user's entries drops out when full)"""
+        timestamp = time.time() if timestamp is None else timestamp
+
+        events = self.sessions.get(user_id)
+        if events is None:
+            events = deque(maxlen=self.capacity)
+            self.sessions[user_id] = events
+        else:
+            self.sessions.move_to_end(user_id)
+        events.append((product_id, float(weight), timestamp))
+
+        while len(self.sessions) > self.max_users:
+            self.sessions.popitem(last=False)
+
+    def recent(self, user_id, now=None, since=None):
+        """
+        The user's recent interactions with time-decayed weights
+
+        Args:
+            user_id: User to look up
+            now: Current time (default: time.time())
+            since: Drop events buffered at or before this time, e.g. the data
+                   cutoff of the model being served (they are in its training data)
+
+        Returns:
+            List of (product_id, weight) tuples, newest last ([] if none)
+        """
+        events = self.sessions.get(user_id)
+        if not events:
+            return []
+
+        now = time.time() if now is None else now
+        # Events are in arrival order, so expired ones are at the front
+        while events and (now - events[0][2] > self.ttl_seconds or
+                          (since is not None and events[0][2] <= since)):
+            events.popleft()
+        if not events:
+            del self.sessions[user_id]
+            return []
+
+        return [
+            (product_id, weight * 0.5 ** (max(now - timestamp, 0) / self.half_life_seconds))
+            for product_id, weight, timestamp in events
+        ]
+
+    def get_stats(self):
+        """Number of active users and buffered interactions"""
+        return {
+            "active_users": len(self.sessions),
+            "buffered_interactions": sum(len(events) for events in self.sessions.values()),
+            "capacity": self.capacity,
+            "max_users": self.max_users
+        }
@@ -0,0 +1,212 @@
+"""
+Shared, memory-mapped CF model for multiple serving processes
+
+Every Node worker that asks Python for recommendations would otherwise load
+its own copy of the factors and id tables. Instead, the training process
+publishes the model's arrays once as plain files:
+
+    shared_model/
+        CURRENT                 name of the live version (switched atomically)
+        v<version>/
+            manifest.json       engine, counts, training date, data cutoff, stats
+            user_factors.npy    (n_users × k)
+            product_factors.npy (n_products × k)
+            user_ids.npy        sorted user ids (fixed-width strings)
+            user_rows.npy       row of each sorted user id in user_factors
+            product_ids.npy     product ids in column order
+            product_sorted_ids.npy / product_rows.npy
+                                sorted product ids and their columns
+            matrix/             interaction CSR (matrix_snapshot format) for
+                                excluding already rated products; hard links
+                                to the training snapshot for out-of-core models
+            top_products.npy / top_ratings.npy
+                                precomputed top-K table of every user, added
+                                by parallel_precompute.py
+
+Serving processes attach with np.load(mmap_mode='r'): nothing is copied, and
+all processes on the host share the same pages of the OS page cache, so
+memory stays constant as workers are added. A new training run publishes a
+new version directory and then replaces CURRENT; readers pick it up on their
+next lookup. Old versions are pruned, and a process still holding one keeps
+reading its (unlinked) files until it re-attaches.
+"""
+
+import os
+import json
+import shutil
+import time
+import numpy as np
+from datetime import datetime
+from collaborative_filtering import CollaborativeFilteringModel
+from matrix_snapshot import MemmapCSR, link_snapshot, write_csr
+
+CURRENT_FILE = 'CURRENT'
+
+
+def publish_model(model, root_dir, keep_versions=2, data_cutoff=None):
+    """
+    Publish a trained model's arrays as a new shared version
+
+    Args:
+        model: Trained CollaborativeFilteringModel
+        root_dir: Shared model directory
+        keep_versions: Number of versions to keep on disk (including the new one)
+        data_cutoff: Unix time up to which interactions are in the training data
+                     (default: the training date); session events buffered
+                     before it are not folded in again
+
+    Returns:
+        Name of the published version
+    """
+    if not model.is_trained:
+        raise ValueError("Cannot publish untrained model!")
+
+    os.makedirs(root_dir, exist_ok=True)
+    version = int(time.time() * 1000)
+    while os.path.exists(os.path.join(root_dir, f"v{version}")):
+        version += 1
+    version = f"v{version}"
+    tmp_dir = os.path.join(root_dir, version + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    user_ids = np.array([str(user_id) for user_id in model.user_ids])
+    user_rows = np.argsort(user_ids, kind="stable")
+    np.save(os.path.join(tmp_dir, 'user_factors.npy'), np.ascontiguousarray(model.user_factors))
+    np.save(os.path.join(tmp_dir, 'product_factors.npy'), np.ascontiguousarray(model.product_factors))
+    np.save(os.path.join(tmp_dir, 'user_ids.npy'), user_ids[user_rows])
+    np.save(os.path.join(tmp_dir, 'user_rows.npy'), user_rows)
+    product_ids = np.array([str(product_id) for product_id in model.product_ids])
+    product_rows = np.argsort(product_ids, kind="stable")
+    np.save(os.path.join(tmp_dir, 'product_ids.npy'), product_ids)
+    np.save(os.path.join(tmp_dir, 'product_sorted_ids.npy'), product_ids[product_rows])
+    np.save(os.path.join(tmp_dir, 'product_rows.npy'), product_rows)
+    if isinstance(model.interaction_matrix, MemmapCSR):
+        # Already on disk: link the snapshot's files instead of copying them
+        link_snapshot(model.interaction_matrix.directory, os.path.join(tmp_dir, 'matrix'))
+    else:
+        write_csr(os.path.join(tmp_dir, 'matrix'), model.interaction_matrix, [], [])
+
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump({
+            "version": version,
+            "engine": model.engine,
+            "n_factors": int(model.n_factors),
+            "training_date": model.training_date,
+            "data_cutoff": data_cutoff,
+            "stats": model.get_model_stats()
+        }, f)
+
+    os.replace(tmp_dir, os.path.join(root_dir, version))
+
+    # Switch readers over: write the pointer to a temp file and rename it
+    pointer_tmp = os.path.join(root_dir, CURRENT_FILE + '.tmp')
+    with open(pointer_tmp, 'w') as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(root_dir, CURRENT_FILE))
+
+    _prune_versions(root_dir, keep_versions)
+    return version
+
+
+def _prune_versions(root_dir, keep_versions):
+    """Remove all but the newest keep_versions version directories"""
+    versions = sorted(
+        (name for name in os.listdir(root_dir) if name.startswith('v') and not name.endswith('.tmp')),
+        key=lambda name: int(name[1:])
+    )
+    for name in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(root_dir, name), ignore_errors=True)
+
+
+class SharedModel(CollaborativeFilteringModel):
+    """
+    Read-only CF model attached to one published version
+
+    Scoring is inherited from CollaborativeFilteringModel; only the storage
+    differs (memory-mapped arrays, user and product lookup by binary search
+    over sorted id tables instead of Python lists).
+    """
+
+    def __init__(self, version_dir):
+        with open(os.path.join(version_dir, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+
+        super().__init__(n_factors=manifest["n_factors"], engine=manifest["engine"])
+        self.version = manifest["version"]
+        self.version_dir = version_dir
+        self.manifest_stats = manifest["stats"]
+        self.training_date = manifest["training_date"]
+        self.data_cutoff = manifest.get("data_cutoff")
+        if self.data_cutoff is None and self.training_date:
+            self.data_cutoff = datetime.fromisoformat(self.training_date).timestamp()
+
+        self.user_factors = np.load(os.path.join(version_dir, 'user_factors.npy'), mmap_mode='r')
+        self.product_factors = np.load(os.path.join(version_dir, 'product_factors.npy'), mmap_mode='r')
+        self.sorted_user_ids = np.load(os.path.join(version_dir, 'user_ids.npy'), mmap_mode='r')
+        self.user_rows = np.load(os.path.join(version_dir, 'user_rows.npy'), mmap_mode='r')
+        self.product_ids = np.load(os.path.join(version_dir, 'product_ids.npy'), mmap_mode='r')
+        self.sorted_product_ids = np.load(os.path.join(version_dir, 'product_sorted_ids.npy'), mmap_mode='r')
+        self.product_rows = np.load(os.path.join(version_dir, 'product_rows.npy'), mmap_mode='r')
+        self.interaction_matrix = MemmapCSR(os.path.join(version_dir, 'matrix'), load_ids=False)
+        self.is_trained = True
+
+    @property
+    def user_ids(self):
+        """User ids in factor row order (materialized on demand; prefer _user_index)"""
+        ids = np.empty(len(self.sorted_user_ids), dtype=self.sorted_user_ids.dtype)
+        ids[self.user_rows] = self.sorted_user_ids
+        return ids.tolist()
+
+    @user_ids.setter
+    def user_ids(self, value):
+        # The base class initializes user_ids; the shared table is read-only
+        pass
+
+    @staticmethod
+    def _lookup(sorted_ids, rows, key):
+        """Binary search over a sorted, memory-mapped id table"""
+        pos = int(np.searchsorted(sorted_ids, key))
+        if pos < len(sorted_ids) and sorted_ids[pos] == key:
+            return int(rows[pos])
+        return None
+
+    def _user_index(self, user_id):
+        return self._lookup(self.sorted_user_ids, self.user_rows, user_id)
+
+    def _product_index(self, product_id):
+        return self._lookup(self.sorted_product_ids, self.product_rows, product_id)
+
+    def get_model_stats(self):
+        """Stats recorded when the version was published, plus the version name"""
+        return dict(self.manifest_stats, shared_version=self.version)
+
+
+class SharedModelReader:
+    """
+    Attach to the current shared version and follow version switches
+
+    Each call to current() costs one small read of CURRENT; the arrays are
+    re-mapped only when the version actually changed.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.model = None
+
+    def current_version(self):
+        """Name of the live version, or None if nothing was published yet"""
+        try:
+            with open(os.path.join(self.root_dir, CURRENT_FILE), 'r') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def current(self):
+        """The SharedModel of the live version (None if nothing was published)"""
+        version = self.current_version()
+        if version is None:
+            return None
+        if self.model is None or self.model.version != version:
+            self.model = SharedModel(os.path.join(self.root_dir, version))
+        return self.model
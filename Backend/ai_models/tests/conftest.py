@@ -0,0 +1,11 @@
+"""
+Shared fixtures for the ai_models tests
+
+The modules import each other by their flat names (as when run with
+`python cf_integration.py ...`), so their directory goes on sys.path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,92 @@
+"""CFIntegration: training outputs and the serve loop, without MongoDB"""
+
+import json
+import os
+import runpy
+import sys
+import time
+
+import pytest
+
+from cf_integration import CFIntegration
+from collaborative_filtering import CollaborativeFilteringModel
+
+
+@pytest.fixture
+def integration(tmp_path, monkeypatch):
+    cf = CFIntegration(model_path=str(tmp_path / 'cf_model.pkl'), engine='subspace')
+    # No database: training still saves and publishes, materializing is skipped
+    monkeypatch.setattr(cf, 'open_database', lambda: (None, None))
+    return cf
+
+
+def interactions():
+    return CollaborativeFilteringModel().generate_synthetic_data(n_users=12, n_products=15, n_interactions=120)
+
+
+def test_session_events_before_the_data_cutoff_are_not_folded_in_again(integration):
+    df = interactions()
+    user_id = str(df['user_id'].iloc[0])
+    integration.handle_request({"command": "ingest", "user_id": user_id, "product_id": "p-old", "weight": 3})
+
+    # Retrain on data read after that event, then one more event arrives
+    integration.data_cutoff = time.time()
+    integration.train_model(df)
+    integration.handle_request({"command": "ingest", "user_id": user_id, "product_id": "p-new", "weight": 2})
+
+    response = integration.handle_request({"command": "recommend", "user_id": user_id, "num_recommendations": 3})
+
+    assert response["success"]
+    assert response["session_items"] == 1
+
+
+@pytest.fixture
+def no_mongodb(monkeypatch):
+    """Fail the test on any attempt to connect to MongoDB"""
+    import pymongo
+
+    def refuse(*args, **kwargs):
+        raise AssertionError("MongoDB must not be contacted")
+    monkeypatch.setattr(pymongo, 'MongoClient', refuse)
+
+
+def test_train_model_writes_the_metadata_sidecar(integration):
+    df = interactions()
+    integration.data_watermark = '2026-10-01T12:00:00'
+    integration.read_seconds = 0.25
+
+    integration.train_model(df)
+
+    with open(integration.metadata_path) as f:
+        metadata = json.load(f)
+    assert metadata["status"] == "trained"
+    assert metadata["n_users"] == df['user_id'].nunique()
+    assert metadata["n_products"] == df['product_id'].nunique()
+    assert metadata["total_interactions"] == len(df.drop_duplicates(['user_id', 'product_id']))
+    assert 0 < metadata["explained_variance"] <= 1
+    assert metadata["training_date"] == integration.model.training_date
+    assert metadata["data_watermark"] == '2026-10-01T12:00:00'
+    assert metadata["timings"]["read_seconds"] == 0.25
+    assert metadata["timings"]["training_seconds"] == metadata["training_seconds"]
+    assert metadata["timings"]["save_seconds"] >= 0
+    assert integration.read_model_stats() == metadata
+
+
+def test_stats_without_a_sidecar_are_not_trained(integration, no_mongodb):
+    assert integration.read_model_stats() == {"status": "not_trained"}
+
+    with open(integration.metadata_path, 'w') as f:
+        f.write('{"status": "trai')
+    assert integration.read_model_stats() == {"status": "not_trained"}
+
+
+def test_stats_command_reads_only_the_sidecar(monkeypatch, capsys, no_mongodb):
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cf_integration.py')
+    monkeypatch.setattr(sys, 'argv', [script, 'stats'])
+
+    with pytest.raises(SystemExit):
+        runpy.run_path(script, run_name='__main__')
+
+    response = json.loads(capsys.readouterr().out)
+    assert response["success"]
+    assert "status" in response["stats"]
@@ -0,0 +1,112 @@
+"""CollaborativeFilteringModel scoring paths"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from collaborative_filtering import CollaborativeFilteringModel
+from training_engines import ImplicitALSEngine
+
+
+def trained_model(engine, n_users=30, n_products=20):
+    model = CollaborativeFilteringModel(n_factors=4, engine=engine)
+    df = model.generate_synthetic_data(n_users=n_users, n_products=n_products, n_interactions=250)
+    # One user who rated every product, one with a single interaction
+    everything = pd.DataFrame({'user_id': 'all', 'product_id': sorted(df['product_id'].unique()), 'rating': 3})
+    single = pd.DataFrame({'user_id': ['one'], 'product_id': [df['product_id'].iloc[0]], 'rating': [5]})
+    df = pd.concat([df, everything, single], ignore_index=True)
+    df = df.groupby(['user_id', 'product_id'], as_index=False)['rating'].max()
+    return model.train(df)
+
+
+@pytest.mark.parametrize("engine", ["svd", "subspace", "als"])
+def test_recommend_block_matches_recommend_products(engine):
+    model = trained_model(engine)
+    # More than some users have unrated products, so short lists are padded
+    n = 15
+
+    rows = []
+    for start, indices, ratings in model.iter_recommendations(n, block_size=7):
+        for offset in range(len(indices)):
+            valid = indices[offset] >= 0
+            rows.append([
+                (str(model.product_ids[i]), float(rating))
+                for i, rating in zip(indices[offset][valid], ratings[offset][valid])
+            ])
+
+    assert len(rows) == len(model.user_ids)
+    for user_id, block_list in zip(model.user_ids, rows):
+        assert block_list == model.recommend_products(user_id, n)
+
+
+def test_recommend_block_pads_short_lists():
+    model = trained_model("subspace")
+    row = model.user_ids.index('one')
+
+    indices, ratings = model.recommend_block(row, row + 1, n_recommendations=25)
+
+    assert indices.shape == (1, 20)
+    assert (indices >= 0).sum() == 19
+    assert indices[0, -1] == -1 and ratings[0, -1] == 0.0
+
+
+def partly_rated_user(model):
+    """Row and dense ratings of the first user with rated and unrated products"""
+    dense = model.interaction_matrix.toarray()
+    row = next(i for i, ratings in enumerate(dense) if 0 < np.count_nonzero(ratings) < len(ratings))
+    return row, dense[row]
+
+
+def test_session_fold_in_counts_only_the_increase_over_the_trained_row():
+    model = trained_model("subspace")
+    row, ratings = partly_rated_user(model)
+    rated = [str(model.product_ids[i]) for i in np.flatnonzero(ratings)]
+    unrated = str(model.product_ids[np.flatnonzero(ratings == 0)[0]])
+
+    def vector(session):
+        return model._user_vector(row, *model._session_columns(session))
+
+    # Already trained with a weight at least as high: nothing changes
+    lower = ratings[model.product_ids.index(rated[0])]
+    np.testing.assert_allclose(vector([(rated[0], lower), (rated[0], 0.5)]), model.user_factors[row])
+
+    # A higher weight and a repeated new item: the row as training would build it
+    expected = ratings.copy()
+    expected[model.product_ids.index(rated[0])] = lower + 2
+    expected[model.product_ids.index(unrated)] = 3
+    np.testing.assert_allclose(
+        vector([(rated[0], lower + 2), (unrated, 1), (unrated, 3), ('unknown', 5)]),
+        expected @ model.product_factors, atol=1e-10
+    )
+
+
+def test_als_session_fold_in_merges_duplicate_columns_with_max():
+    model = trained_model("als")
+    row, ratings = partly_rated_user(model)
+    rated = str(model.product_ids[np.flatnonzero(ratings)[0]])
+    unrated = str(model.product_ids[np.flatnonzero(ratings == 0)[0]])
+    engine = ImplicitALSEngine(n_factors=4)
+
+    def solve(dense_row):
+        columns = np.flatnonzero(dense_row)
+        return engine.fold_in(model.product_factors, columns, dense_row[columns])
+
+    # A lower weight on a trained item: the trained row is re-solved unchanged
+    np.testing.assert_allclose(model._user_vector(row, *model._session_columns([(rated, 0.5)])),
+                               solve(ratings), atol=1e-10)
+
+    session = [(rated, 0.5), (unrated, 2.0), (unrated, 4.0)]
+    expected = ratings.copy()
+    expected[model.product_ids.index(unrated)] = 4.0
+    np.testing.assert_allclose(model._user_vector(row, *model._session_columns(session)), solve(expected), atol=1e-10)
+
+
+def test_session_of_an_unknown_user_is_scored_and_excluded():
+    model = trained_model("subspace")
+    session = [(str(model.product_ids[2]), 5.0)]
+
+    recommendations = model.recommend_products('new-user', 5, session=session)
+
+    assert len(recommendations) == 5
+    assert str(model.product_ids[2]) not in [product_id for product_id, _ in recommendations]
+    assert model.recommend_products('new-user', 5) == []
@@ -0,0 +1,200 @@
+"""InteractionRollupCompactor against an in-memory MongoDB (mongomock)"""
+
+import itertools
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from interaction_rollups import InteractionRollupCompactor, ROLLUPS_COLLECTION
+
+_counter = itertools.count(1)
+
+
+def event_id(seconds_ago):
+    """Unique ObjectId whose timestamp lies seconds_ago in the past"""
+    created = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    return ObjectId(ObjectId.from_datetime(created).binary[:4] + next(_counter).to_bytes(8, 'big'))
+
+
+def event(user_id, product_id, action, weight, seconds_ago=600):
+    return {
+        '_id': event_id(seconds_ago),
+        'userId': user_id,
+        'productId': product_id,
+        'action': action,
+        'weight': weight,
+        'timestamp': datetime.utcnow() - timedelta(seconds=seconds_ago)
+    }
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()['shop']
+
+
+def rollup(db, user_id, product_id):
+    return db[ROLLUPS_COLLECTION].find_one({'userId': user_id, 'productId': product_id})
+
+
+def test_max_weight_and_counts_across_batches(db):
+    # batch_size=1 flushes after every distinct pair, so the same pair is
+    # folded by several bulk_writes within one run
+    db['interactions'].insert_many([
+        event('u1', 'p1', 'view', 1, 900),
+        event('u1', 'p2', 'view', 1, 890),
+        event('u1', 'p1', 'purchase', 5, 880),
+        event('u2', 'p1', 'cart', 3, 870),
+        event('u1', 'p1', 'view', 1, 860),
+    ])
+
+    result = InteractionRollupCompactor(db, batch_size=1).compact()
+
+    assert result['events_read'] == 5
+    first = rollup(db, 'u1', 'p1')
+    assert first['weight'] == 5
+    assert first['count'] == 3
+    assert first['actions'] == {'view': 2, 'purchase': 1}
+    assert first['firstTimestamp'] < first['lastTimestamp']
+    assert rollup(db, 'u1', 'p2')['count'] == 1
+    assert rollup(db, 'u2', 'p1')['weight'] == 3
+    assert db[ROLLUPS_COLLECTION].count_documents({}) == 3
+
+
+def test_watermark_advances_and_later_runs_only_add_new_events(db):
+    compactor = InteractionRollupCompactor(db, batch_size=2)
+    db['interactions'].insert_many([
+        event('u1', 'p1', 'cart', 3, 900),
+        event('u1', 'p2', 'view', 1, 890),
+        event('u2', 'p1', 'view', 1, 880),
+    ])
+
+    assert compactor.get_watermark() is None
+    assert not compactor.has_rollups()
+    compactor.compact()
+    last = db['interactions'].find_one(sort=[('_id', -1)])['_id']
+    assert compactor.get_watermark() == last
+    assert compactor.has_rollups()
+
+    # Nothing new: no event is counted twice
+    assert compactor.compact()['events_read'] == 0
+    assert rollup(db, 'u1', 'p1')['count'] == 1
+
+    db['interactions'].insert_one(event('u1', 'p1', 'view', 1, 300))
+    result = compactor.compact()
+    assert result['events_read'] == 1
+    assert compactor.get_watermark() > last
+    first = rollup(db, 'u1', 'p1')
+    assert first['weight'] == 3
+    assert first['count'] == 2
+
+
+def test_max_events_stops_at_the_watermark(db):
+    compactor = InteractionRollupCompactor(db)
+    db['interactions'].insert_many([event('u1', f'p{i}', 'view', 1, 900 - i) for i in range(5)])
+
+    assert compactor.compact(max_events=2)['events_read'] == 2
+    assert compactor.compact()['events_read'] == 3
+    assert db[ROLLUPS_COLLECTION].count_documents({}) == 5
+
+
+def test_events_inside_the_settle_window_wait_for_a_later_run(db):
+    compactor = InteractionRollupCompactor(db, settle_seconds=60)
+    settled = event('u1', 'p1', 'view', 1, 600)
+    recent = event('u1', 'p2', 'cart', 3, 5)
+    db['interactions'].insert_many([settled, recent])
+
+    result = compactor.compact()
+
+    assert result['events_read'] == 1
+    assert compactor.get_watermark() == settled['_id']
+    assert rollup(db, 'u1', 'p2') is None
+
+    # Once the window has passed the event is picked up
+    compactor.settle_seconds = 0
+    assert compactor.compact()['events_read'] == 1
+    assert rollup(db, 'u1', 'p2')['weight'] == 3
+
+
+def test_invalid_events_advance_the_watermark_without_a_rollup(db):
+    compactor = InteractionRollupCompactor(db)
+    db['interactions'].insert_many([
+        event('u1', 'p1', 'view', 0, 900),
+        event(None, 'p1', 'view', 1, 890),
+    ])
+
+    assert compactor.compact()['events_read'] == 2
+    assert db[ROLLUPS_COLLECTION].count_documents({}) == 0
+    assert compactor.compact()['events_read'] == 0
+
+
+def test_rebuild_recomputes_from_every_event(db):
+    compactor = InteractionRollupCompactor(db)
+    db['interactions'].insert_many([
+        event('u1', 'p1', 'view', 1, 900),
+        event('u1', 'p1', 'save', 4, 890),
+    ])
+    compactor.compact()
+    # A stale rollup (e.g. from an older weighting) is dropped by rebuild
+    db[ROLLUPS_COLLECTION].update_one({'userId': 'u1', 'productId': 'p1'}, {'$set': {'weight': 99, 'count': 7}})
+    db[ROLLUPS_COLLECTION].insert_one({'userId': 'u9', 'productId': 'p9', 'weight': 1, 'count': 1})
+
+    result = compactor.rebuild()
+
+    assert result['events_read'] == 2
+    assert db[ROLLUPS_COLLECTION].count_documents({}) == 1
+    first = rollup(db, 'u1', 'p1')
+    assert first['weight'] == 4
+    assert first['count'] == 2
+    assert first['actions'] == {'view': 1, 'save': 1}
+
+
+def test_replaying_a_batch_after_a_lost_watermark_counts_nothing_twice(db, monkeypatch):
+    events = [
+        event('u1', 'p1', 'view', 1, 900),
+        event('u1', 'p2', 'cart', 3, 890),
+        event('u1', 'p1', 'purchase', 5, 880),
+        event('u2', 'p1', 'view', 1, 870),
+        event('u1', 'p2', 'view', 1, 860),
+        event('u3', 'p3', 'save', 4, 850),
+    ]
+    db['interactions'].insert_many(events)
+    compactor = InteractionRollupCompactor(db, batch_size=2)
+
+    # The first batch is written, then the watermark write fails
+    set_watermark = compactor._set_watermark
+
+    def fail(*args):
+        raise RuntimeError("connection lost")
+    monkeypatch.setattr(compactor, '_set_watermark', fail)
+    with pytest.raises(RuntimeError):
+        compactor.compact()
+    assert compactor.get_watermark() is None
+    # Only the first batch (the first two events) reached the rollups
+    assert rollup(db, 'u1', 'p1')['count'] == 1
+
+    # The next run reads every event again
+    monkeypatch.setattr(compactor, '_set_watermark', set_watermark)
+    assert compactor.compact()['events_read'] == 6
+
+    expected = InteractionRollupCompactor(mongomock.MongoClient()['replica'], batch_size=2)
+    expected.db['interactions'].insert_many(events)
+    expected.compact()
+    for user_id, product_id in (('u1', 'p1'), ('u1', 'p2'), ('u2', 'p1'), ('u3', 'p3')):
+        replayed = rollup(db, user_id, product_id)
+        clean = rollup(expected.db, user_id, product_id)
+        for field in ('weight', 'count', 'actions', 'lastEventId'):
+            assert replayed[field] == clean[field]
+    assert rollup(db, 'u1', 'p1')['count'] == 2
+    assert rollup(db, 'u1', 'p2')['count'] == 2
+
+
+def test_rollups_record_the_newest_event_folded_in(db):
+    first = event('u1', 'p1', 'view', 1, 900)
+    second = event('u1', 'p1', 'cart', 3, 890)
+    db['interactions'].insert_many([first, second])
+
+    InteractionRollupCompactor(db).compact()
+
+    assert rollup(db, 'u1', 'p1')['lastEventId'] == second['_id']
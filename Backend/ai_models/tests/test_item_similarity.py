@@ -0,0 +1,103 @@
+"""ItemCooccurrenceModel: neighbour lists, related products and persistence"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from item_similarity import ItemCooccurrenceModel
+from matrix_snapshot import MemmapCSR, write_snapshot
+
+
+def baskets(rows):
+    """DataFrame from {user: [product, ...]} with rating 1"""
+    return pd.DataFrame(
+        [(user, product, 1.0) for user, products in rows.items() for product in products],
+        columns=['user_id', 'product_id', 'rating']
+    )
+
+
+@pytest.fixture
+def star():
+    """A co-occurs with E twice and with B, C, D once each"""
+    return baskets({'u1': ['A', 'B'], 'u2': ['A', 'C'], 'u3': ['A', 'D'], 'u4': ['A', 'E'], 'u5': ['A', 'E']})
+
+
+def neighbours(model, product_id):
+    i = model.product_index[product_id]
+    lo, hi = model.neighbors.indptr[i], model.neighbors.indptr[i + 1]
+    return [model.product_ids[j] for j in model.neighbors.indices[lo:hi]], model.neighbors.data[lo:hi]
+
+
+def test_neighbours_are_truncated_best_first_with_ties_in_column_order(star):
+    model = ItemCooccurrenceModel(n_neighbors=3).train(star)
+
+    products, similarity = neighbours(model, 'A')
+
+    # cos(A, E) = 2 / sqrt(5 * 2); B, C and D tie at 1 / sqrt(5); D is cut
+    assert products == ['E', 'B', 'C']
+    np.testing.assert_allclose(similarity, [2 / np.sqrt(10), 1 / np.sqrt(5), 1 / np.sqrt(5)])
+    assert neighbours(model, 'B')[0] == ['A']
+
+
+def test_snapshot_build_matches_the_in_memory_build(tmp_path):
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame({
+        'user_id': [f"u{u:02d}" for u in rng.randint(0, 30, size=300)],
+        'product_id': [f"p{p:02d}" for p in rng.randint(0, 25, size=300)],
+        'rating': rng.randint(1, 6, size=300).astype(float)
+    })
+    df = df.groupby(['user_id', 'product_id'], as_index=False)['rating'].max()
+    write_snapshot(str(tmp_path), df)
+    # Small blocks and chunks, so both builds assemble the matrix in pieces
+    snapshot = MemmapCSR(str(tmp_path), chunk_rows=7)
+
+    in_memory = ItemCooccurrenceModel(n_neighbors=5, block_size=4, recent_items=3).train(df)
+    streamed = ItemCooccurrenceModel(n_neighbors=5, block_size=4, recent_items=3).train_from_snapshot(snapshot)
+
+    assert streamed.product_ids == in_memory.product_ids
+    assert streamed.user_ids == in_memory.user_ids
+    np.testing.assert_array_equal(streamed.neighbors.indptr, in_memory.neighbors.indptr)
+    np.testing.assert_array_equal(streamed.neighbors.indices, in_memory.neighbors.indices)
+    np.testing.assert_allclose(streamed.neighbors.data, in_memory.neighbors.data)
+    # Without timestamps both keep each user's strongest products
+    np.testing.assert_array_equal(streamed.user_history.toarray(), in_memory.user_history.toarray())
+
+
+def test_related_for_user_prefers_the_session_over_the_stored_history():
+    df = baskets({'u1': ['A', 'B'], 'u2': ['A', 'B'], 'u3': ['C', 'D'], 'u4': ['C', 'D'], 'u5': ['B', 'D']})
+    df['timestamp'] = pd.to_datetime('2026-01-01') + pd.to_timedelta(np.arange(len(df)), unit='min')
+    # u5 viewed B, then D: only D is kept as recent
+    model = ItemCooccurrenceModel(recent_items=1).train(df)
+
+    assert [p for p, _ in model.related_for_user('u5', 5)] == ['C', 'B']
+    assert [p for p, _ in model.related_for_user('u5', 5, recent=[('A', 1.0)])] == ['B']
+    # A session of unknown products falls back to the history
+    assert [p for p, _ in model.related_for_user('u5', 5, recent=[('Z', 1.0)])] == ['C', 'B']
+    assert model.related_for_user('nobody', 5) == []
+
+
+def test_source_and_excluded_products_are_left_out(star):
+    model = ItemCooccurrenceModel().train(star)
+
+    related = model.related_products(['E', 'B'], 5)
+
+    assert [p for p, _ in related] == ['A']
+    assert model.related_products(['E'], 5, exclude=['A']) == []
+    assert [p for p, _ in model.related_products(['A'], 2)] == ['E', 'B']
+
+
+def test_save_and_load_round_trip(star, tmp_path):
+    model = ItemCooccurrenceModel(n_neighbors=3, recent_items=1).train(star)
+    path = str(tmp_path / 'cf_model_items.npz')
+    model.save_model(path)
+
+    loaded = ItemCooccurrenceModel()
+    loaded.load_model(path)
+
+    assert loaded.is_trained
+    assert loaded.n_neighbors == 3 and loaded.recent_items == 1
+    assert loaded.product_ids == model.product_ids and loaded.user_ids == model.user_ids
+    np.testing.assert_array_equal(loaded.neighbors.toarray(), model.neighbors.toarray())
+    np.testing.assert_array_equal(loaded.user_history.toarray(), model.user_history.toarray())
+    assert loaded.related_for_user('u1', 3) == model.related_for_user('u1', 3)
+    assert loaded.get_model_stats()['training_date'] == model.training_date
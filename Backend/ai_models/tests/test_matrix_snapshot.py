@@ -0,0 +1,68 @@
+"""Memory-mapped CSR snapshots and their versioned directories"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from matrix_snapshot import MemmapCSR, new_snapshot_directory, prune_snapshots, write_csr, write_snapshot
+
+
+def random_matrix(n_users=23, n_products=11, seed=0):
+    rng = np.random.RandomState(seed)
+    return sparse.random(n_users, n_products, density=0.3, random_state=rng, format='csr', dtype=np.float32)
+
+
+def test_streaming_products_match_scipy(tmp_path):
+    matrix = random_matrix()
+    write_csr(str(tmp_path), matrix, [f"u{i}" for i in range(23)], [f"p{i}" for i in range(11)])
+    snapshot = MemmapCSR(str(tmp_path), chunk_rows=5)
+    block = np.random.RandomState(1).normal(size=(11, 3))
+    user_block = np.random.RandomState(2).normal(size=(23, 3))
+
+    assert snapshot.shape == (23, 11) and snapshot.nnz == matrix.nnz
+    assert snapshot.user_ids[0] == "u0" and snapshot.product_ids[-1] == "p10"
+    np.testing.assert_allclose(snapshot.dot(block), matrix @ block, rtol=1e-6)
+    np.testing.assert_allclose(snapshot.rdot(user_block), matrix.T @ user_block, rtol=1e-6)
+    mean, sq_mean = snapshot.column_moments()
+    np.testing.assert_allclose(mean, matrix.toarray().mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(sq_mean, (matrix.toarray() ** 2).mean(axis=0), rtol=1e-6)
+
+
+def test_write_snapshot_from_interactions(tmp_path):
+    df = pd.DataFrame({
+        'user_id': ['b', 'a', 'b', 'a'],
+        'product_id': ['x', 'y', 'y', 'x'],
+        'rating': [1.0, 2.0, 3.0, 5.0]
+    })
+
+    snapshot = write_snapshot(str(tmp_path), df)
+
+    assert snapshot.user_ids == ['a', 'b'] and snapshot.product_ids == ['x', 'y']
+    dense = sparse.csr_matrix((snapshot.data, snapshot.indices, snapshot.indptr), shape=snapshot.shape).toarray()
+    np.testing.assert_array_equal(dense, [[5.0, 2.0], [1.0, 3.0]])
+
+
+def test_prune_keeps_only_the_snapshot_in_use(tmp_path):
+    root = str(tmp_path)
+    matrix = random_matrix()
+    ids = ([f"u{i}" for i in range(23)], [f"p{i}" for i in range(11)])
+    # Files of an unversioned snapshot written directly into the root
+    write_csr(root, matrix, *ids)
+    old = new_snapshot_directory(root)
+    write_csr(old, matrix, *ids)
+    current = new_snapshot_directory(root)
+    assert current != old
+    write_csr(current, matrix, *ids)
+    os.makedirs(new_snapshot_directory(root) + '.tmp')
+
+    # A model loaded from the old version keeps reading it until pruning
+    reader = MemmapCSR(old)
+    assert reader.nnz == matrix.nnz
+
+    removed = prune_snapshots(root, keep=current)
+
+    assert removed == 2
+    assert os.listdir(root) == [os.path.basename(current)]
+    assert MemmapCSR(current).nnz == matrix.nnz
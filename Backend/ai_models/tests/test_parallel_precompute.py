@@ -0,0 +1,65 @@
+"""Process-pool precompute of the top-K table against serial scoring"""
+
+import os
+
+import numpy as np
+import pytest
+
+from collaborative_filtering import CollaborativeFilteringModel
+from parallel_precompute import precompute_recommendations
+from shared_model import SharedModel, publish_model
+
+
+@pytest.fixture(scope="module")
+def published(tmp_path_factory):
+    model = CollaborativeFilteringModel(n_factors=4, engine="subspace")
+    model.train(model.generate_synthetic_data(n_users=40, n_products=25, n_interactions=300))
+    root = str(tmp_path_factory.mktemp("shared_model"))
+    version = publish_model(model, root)
+    return model, os.path.join(root, version)
+
+
+@pytest.mark.parametrize("n_workers, shard_size", [(1, None), (2, 8), (3, 5)])
+def test_table_matches_serial_scoring(published, n_workers, shard_size):
+    model, version_dir = published
+
+    top_products, top_ratings = precompute_recommendations(
+        version_dir, 6, n_workers=n_workers, shard_size=shard_size, block_size=4, progress=False
+    )
+
+    # Rows follow the trained model's user order
+    indices, ratings = model.recommend_block(0, len(model.user_ids), 6)
+    assert top_products.shape == (40, 6) and top_products.dtype == np.int32
+    np.testing.assert_array_equal(top_products, indices)
+    np.testing.assert_allclose(top_ratings, ratings, rtol=1e-6)
+    for row in (0, 17, 39):
+        user_id = model.user_ids[row]
+        assert [str(model.product_ids[i]) for i in top_products[row]] == \
+            [product_id for product_id, _ in model.recommend_products(user_id, 6)]
+
+
+def test_table_is_stored_in_the_version_directory(published):
+    _, version_dir = published
+
+    top_products, _ = precompute_recommendations(version_dir, 3, n_workers=1, progress=False)
+
+    reloaded = SharedModel(version_dir)
+    np.testing.assert_array_equal(np.load(os.path.join(version_dir, 'top_products.npy')), top_products)
+    assert not [name for name in os.listdir(version_dir) if name.endswith('.tmp')]
+    assert len(reloaded.user_factors) == top_products.shape[0]
+
+
+def test_progress_goes_to_the_current_stderr(published, capsys):
+    _, version_dir = published
+
+    precompute_recommendations(version_dir, 3, n_workers=1)
+
+    assert "Precompute: 40/40 users" in capsys.readouterr().err
+
+
+def test_progress_can_be_silenced(published, capsys):
+    _, version_dir = published
+
+    precompute_recommendations(version_dir, 3, n_workers=1, progress=False)
+
+    assert capsys.readouterr().err == ""
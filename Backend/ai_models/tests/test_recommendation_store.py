@@ -0,0 +1,97 @@
+"""RecommendationPublisher against an in-memory MongoDB (mongomock)"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import mongomock
+import numpy as np
+import pytest
+
+from recommendation_store import RecommendationPublisher, RECOMMENDATIONS_COLLECTION
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()['shop']
+
+
+def model(n_users=5):
+    return SimpleNamespace(user_ids=[f"u{i}" for i in range(n_users)], product_ids=['p0', 'p1', 'p2', 'p3'])
+
+
+def table(n_users=5):
+    """Top-2 lists: user i gets products i % 4 and (i + 1) % 4"""
+    indices = np.array([[i % 4, (i + 1) % 4] for i in range(n_users)])
+    ratings = np.array([[4.567, 3.2] for _ in range(n_users)], dtype=np.float32)
+    return indices, ratings
+
+
+def publish(db, indices, ratings, version, **kwargs):
+    publisher = RecommendationPublisher(db, max_writes_per_second=None, **kwargs)
+    return publisher.publish(model(len(indices)), version, n_recommendations=2, blocks=[(0, indices, ratings)])
+
+
+def test_first_publish_writes_every_user_in_the_stored_shape(db):
+    indices, ratings = table()
+
+    result = publish(db, indices, ratings, 'v1')
+
+    assert result == {'users': 5, 'written': 5, 'unchanged': 0, 'model_version': 'v1'}
+    doc = db[RECOMMENDATIONS_COLLECTION].find_one({'userId': 'u1'}, {'_id': 0})
+    assert set(doc) == {'userId', 'recommendations', 'digest', 'modelVersion', 'updatedAt'}
+    assert doc['recommendations'] == [
+        {'productId': 'p1', 'predictedRating': 4.57},
+        {'productId': 'p2', 'predictedRating': 3.2}
+    ]
+    assert doc['digest'] == RecommendationPublisher.digest(['p1', 'p2'])
+    assert doc['modelVersion'] == 'v1'
+    assert isinstance(doc['updatedAt'], datetime)
+
+
+def test_identical_publish_writes_nothing(db):
+    indices, ratings = table()
+    publish(db, indices, ratings, 'v1')
+
+    result = publish(db, indices, ratings * 0.9, 'v2')
+
+    assert result['written'] == 0 and result['unchanged'] == 5
+    # Unchanged lists keep their version and ratings
+    doc = db[RECOMMENDATIONS_COLLECTION].find_one({'userId': 'u3'})
+    assert doc['modelVersion'] == 'v1'
+    assert doc['recommendations'][0]['predictedRating'] == 4.57
+
+
+def test_only_changed_lists_are_written(db):
+    indices, ratings = table()
+    publish(db, indices, ratings, 'v1')
+    db[RECOMMENDATIONS_COLLECTION].update_one({'userId': 'u2'}, {'$set': {'lastInteractionAt': datetime(2030, 1, 1)}})
+
+    # u2's list changes order, u4 loses an entry (-1 = no candidate)
+    indices[2] = indices[2][::-1]
+    indices[4, 1] = -1
+    result = publish(db, indices, ratings, 'v2')
+
+    assert result['written'] == 2 and result['unchanged'] == 3
+    changed = db[RECOMMENDATIONS_COLLECTION].find_one({'userId': 'u2'})
+    assert [rec['productId'] for rec in changed['recommendations']] == ['p3', 'p2']
+    assert changed['modelVersion'] == 'v2'
+    # Fields written by Node are left alone
+    assert changed['lastInteractionAt'] == datetime(2030, 1, 1)
+    assert len(db[RECOMMENDATIONS_COLLECTION].find_one({'userId': 'u4'})['recommendations']) == 1
+    assert db[RECOMMENDATIONS_COLLECTION].find_one({'userId': 'u0'})['modelVersion'] == 'v1'
+
+
+def test_writes_are_split_into_batches(db, monkeypatch):
+    indices, ratings = table(7)
+    publisher = RecommendationPublisher(db, batch_size=3, max_writes_per_second=None)
+    batches = []
+    bulk_write = publisher.collection.bulk_write
+    monkeypatch.setattr(publisher.collection, 'bulk_write',
+                        lambda operations, ordered: batches.append(len(operations)) or bulk_write(operations, ordered=ordered))
+
+    result = publisher.publish(model(7), 'v1', n_recommendations=2, blocks=[(0, indices[:4], ratings[:4]),
+                                                                          (4, indices[4:], ratings[4:])])
+
+    assert result['written'] == 7
+    assert batches == [3, 3, 1]
+    assert db[RECOMMENDATIONS_COLLECTION].count_documents({}) == 7
@@ -0,0 +1,56 @@
+"""SessionBuffer: TTL, time decay, eviction and the model data cutoff"""
+
+import pytest
+
+from session_buffer import SessionBuffer
+
+
+def test_weights_halve_every_half_life():
+    buffer = SessionBuffer(half_life_seconds=600, ttl_seconds=1800)
+    buffer.ingest('u1', 'p1', 4.0, timestamp=1000)
+    buffer.ingest('u1', 'p2', 2.0, timestamp=1600)
+
+    recent = buffer.recent('u1', now=1600)
+
+    assert recent == [('p1', pytest.approx(2.0)), ('p2', pytest.approx(2.0))]
+    assert buffer.recent('u1', now=2200)[1] == ('p2', pytest.approx(1.0))
+
+
+def test_events_past_the_ttl_are_dropped():
+    buffer = SessionBuffer(ttl_seconds=1800)
+    buffer.ingest('u1', 'p1', 1.0, timestamp=0)
+    buffer.ingest('u1', 'p2', 1.0, timestamp=1000)
+
+    assert [product for product, _ in buffer.recent('u1', now=1800)] == ['p1', 'p2']
+    assert [product for product, _ in buffer.recent('u1', now=2000)] == ['p2']
+    assert buffer.recent('u1', now=3000) == []
+    assert 'u1' not in buffer.sessions
+
+
+def test_events_before_the_data_cutoff_are_dropped():
+    buffer = SessionBuffer()
+    buffer.ingest('u1', 'p1', 1.0, timestamp=100)
+    buffer.ingest('u1', 'p2', 1.0, timestamp=200)
+
+    assert [product for product, _ in buffer.recent('u1', now=300, since=100)] == ['p2']
+    assert buffer.recent('u1', now=300, since=250) == []
+
+
+def test_ring_buffer_keeps_the_newest_events():
+    buffer = SessionBuffer(capacity=3)
+    for i in range(5):
+        buffer.ingest('u1', f'p{i}', 1.0, timestamp=100 + i)
+
+    assert [product for product, _ in buffer.recent('u1', now=110)] == ['p2', 'p3', 'p4']
+
+
+def test_least_recently_active_user_is_evicted():
+    buffer = SessionBuffer(max_users=2)
+    buffer.ingest('u1', 'p1', timestamp=100)
+    buffer.ingest('u2', 'p1', timestamp=101)
+    # u1 becomes the most recently active again
+    buffer.ingest('u1', 'p2', timestamp=102)
+    buffer.ingest('u3', 'p1', timestamp=103)
+
+    assert list(buffer.sessions) == ['u1', 'u3']
+    assert buffer.get_stats()['buffered_interactions'] == 3
@@ -0,0 +1,91 @@
+"""Publishing the model as memory-mapped versions and attaching to them"""
+
+import os
+
+import numpy as np
+
+from collaborative_filtering import CollaborativeFilteringModel
+from matrix_snapshot import write_snapshot
+from shared_model import CURRENT_FILE, SharedModel, SharedModelReader, publish_model
+
+
+def trained_model(seed=42):
+    model = CollaborativeFilteringModel(n_factors=4, engine="subspace")
+    return model.train(model.generate_synthetic_data(n_users=25, n_products=18, n_interactions=200, random_seed=seed))
+
+
+def test_shared_model_recommends_like_the_trained_model(tmp_path):
+    model = trained_model()
+    publish_model(model, str(tmp_path))
+
+    shared = SharedModelReader(str(tmp_path)).current()
+
+    assert isinstance(shared, SharedModel)
+    assert shared.user_ids == [str(user_id) for user_id in model.user_ids]
+    for user_id in model.user_ids:
+        assert shared.recommend_products(str(user_id), 5) == model.recommend_products(user_id, 5)
+    session = [(str(model.product_ids[3]), 2.0), ('unknown-product', 5.0)]
+    assert shared.recommend_products('new-user', 5, session=session) == \
+        model.recommend_products('new-user', 5, session=session)
+
+
+def test_binary_search_lookup_of_known_and_unknown_ids(tmp_path):
+    model = trained_model()
+    shared = SharedModel(os.path.join(str(tmp_path), publish_model(model, str(tmp_path))))
+
+    for row, user_id in enumerate(model.user_ids):
+        assert shared._user_index(str(user_id)) == row
+    for column, product_id in enumerate(model.product_ids):
+        assert shared._product_index(str(product_id)) == column
+    # Before the first, between two and after the last sorted id
+    for unknown in ('', 'product_10a', 'zzz'):
+        assert shared._user_index(unknown) is None
+        assert shared._product_index(unknown) is None
+    assert shared.recommend_products('zzz', 5) == []
+
+
+def test_a_new_version_switches_current_and_the_reader_reattaches(tmp_path):
+    root = str(tmp_path)
+    reader = SharedModelReader(root)
+    assert reader.current() is None
+
+    first = publish_model(trained_model(), root)
+    attached = reader.current()
+    assert attached.version == first
+    # No new version: the same mapping is reused
+    assert reader.current() is attached
+
+    second = publish_model(trained_model(seed=7), root)
+
+    with open(os.path.join(root, CURRENT_FILE)) as f:
+        assert f.read() == second
+    assert second != first
+    assert reader.current().version == second
+    assert reader.current() is not attached
+
+
+def test_only_keep_versions_versions_are_kept(tmp_path):
+    root = str(tmp_path)
+    model = trained_model()
+
+    versions = [publish_model(model, root, keep_versions=2) for _ in range(4)]
+
+    assert sorted(name for name in os.listdir(root) if name.startswith('v')) == sorted(versions[-2:])
+    assert not [name for name in os.listdir(root) if name.endswith('.tmp')]
+
+
+def test_out_of_core_model_links_its_snapshot_instead_of_copying(tmp_path):
+    model = CollaborativeFilteringModel(n_factors=4)
+    df = model.generate_synthetic_data(n_users=25, n_products=18, n_interactions=200)
+    snapshot = write_snapshot(str(tmp_path / 'snapshot'), df.groupby(['user_id', 'product_id'], as_index=False)['rating'].max())
+    model.train_from_snapshot(snapshot)
+
+    version = publish_model(model, str(tmp_path / 'shared'))
+
+    matrix_dir = tmp_path / 'shared' / version / 'matrix'
+    for name in ('indptr.bin', 'indices.bin', 'data.bin'):
+        assert os.path.samefile(matrix_dir / name, tmp_path / 'snapshot' / name)
+    shared = SharedModelReader(str(tmp_path / 'shared')).current()
+    np.testing.assert_array_equal(shared.interaction_matrix.indices, snapshot.indices)
+    user_id = str(model.user_ids[0])
+    assert shared.recommend_products(user_id, 5) == model.recommend_products(user_id, 5)
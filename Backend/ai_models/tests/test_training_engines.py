@@ -0,0 +1,211 @@
+"""Training engines against dense reference solutions"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from matrix_snapshot import MemmapCSR, write_csr
+from training_engines import ImplicitALSEngine, OutOfCoreSVDEngine, SubspaceIterationEngine
+
+
+def planted_matrix(n_users=60, n_products=40, rank=5, noise=0.05, seed=0):
+    """Sparse-format matrix with a clear rank-`rank` structure plus noise"""
+    rng = np.random.RandomState(seed)
+    left, _ = np.linalg.qr(rng.normal(size=(n_users, rank)))
+    right, _ = np.linalg.qr(rng.normal(size=(n_products, rank)))
+    dense = left @ np.diag([50.0, 40.0, 30.0, 20.0, 10.0][:rank]) @ right.T
+    dense += noise * rng.normal(size=dense.shape)
+    return sparse.csr_matrix(dense)
+
+
+def dense_rank_k(matrix, k):
+    """Best rank-k approximation and top singular values from a dense SVD"""
+    u, s, vt = np.linalg.svd(matrix.toarray(), full_matrices=False)
+    return (u[:, :k] * s[:k]) @ vt[:k], s[:k]
+
+
+def test_subspace_matches_dense_svd():
+    matrix = planted_matrix()
+    engine = SubspaceIterationEngine(n_factors=5, max_iter=50, tol=1e-10)
+
+    user_factors, product_factors, info = engine.fit(matrix)
+
+    reference, singular_values = dense_rank_k(matrix, 5)
+    np.testing.assert_allclose(info["singular_values"], singular_values, rtol=1e-8)
+    np.testing.assert_allclose(user_factors @ product_factors.T, reference, atol=1e-6)
+    # TruncatedSVD semantics: orthonormal product factors, user factors = R V
+    np.testing.assert_allclose(product_factors.T @ product_factors, np.eye(5), atol=1e-10)
+    np.testing.assert_allclose(user_factors, matrix @ product_factors, atol=1e-10)
+    assert not info["warm_start"]
+
+
+def test_subspace_warm_start_converges_quickly_with_new_products():
+    matrix = planted_matrix()
+    user_ids = [f"u{i}" for i in range(matrix.shape[0])]
+    product_ids = [f"p{i}" for i in range(matrix.shape[1])]
+    engine = SubspaceIterationEngine(n_factors=5, max_iter=50, tol=1e-8)
+    user_factors, product_factors, cold = engine.fit(matrix)
+
+    # The previous model did not know the last three products
+    warm_start = {
+        "user_ids": user_ids, "user_factors": user_factors,
+        "product_ids": product_ids[:-3], "product_factors": product_factors[:-3],
+        "current_user_ids": user_ids, "current_product_ids": product_ids,
+    }
+    warm_users, warm_products, warm = engine.fit(matrix, warm_start=warm_start)
+
+    assert warm["warm_start"]
+    assert warm["iterations"] < cold["iterations"]
+    reference, _ = dense_rank_k(matrix, 5)
+    np.testing.assert_allclose(warm_users @ warm_products.T, reference, atol=1e-6)
+
+
+def test_subspace_caps_the_rank_at_the_matrix_size():
+    matrix = sparse.csr_matrix(np.array([[1.0, 0.0, 2.0], [0.0, 3.0, 0.0]]))
+
+    user_factors, product_factors, _ = SubspaceIterationEngine(n_factors=10).fit(matrix)
+
+    assert user_factors.shape == (2, 2)
+    assert product_factors.shape == (3, 2)
+    np.testing.assert_allclose(user_factors @ product_factors.T, matrix.toarray(), atol=1e-10)
+
+
+def test_out_of_core_on_a_snapshot_matches_dense_svd(tmp_path):
+    matrix = planted_matrix()
+    write_csr(str(tmp_path), matrix, [f"u{i}" for i in range(60)], [f"p{i}" for i in range(40)])
+    # Small chunks, so every pass streams several row chunks
+    snapshot = MemmapCSR(str(tmp_path), chunk_rows=7)
+
+    user_factors, product_factors, info = OutOfCoreSVDEngine(n_factors=5).fit(snapshot)
+
+    # The snapshot stores float32 weights
+    reference, singular_values = dense_rank_k(sparse.csr_matrix(matrix.toarray().astype(np.float32)), 5)
+    assert info["iterations"] <= 3
+    np.testing.assert_allclose(info["singular_values"], singular_values, rtol=1e-6)
+    np.testing.assert_allclose(user_factors @ product_factors.T, reference, atol=1e-4)
+
+
+@pytest.mark.parametrize("scores, expected", [(-2.0, 1.0), (3.5, 3.5), (9.0, 5.0)])
+def test_subspace_scores_are_clipped_to_the_rating_scale(scores, expected):
+    assert SubspaceIterationEngine.to_rating(np.array([scores]))[0] == expected
+
+
+def interaction_matrix(n_users=50, n_products=30, density=0.2, seed=1):
+    """Random implicit-feedback weights (1-5), plus one user who touched every product"""
+    rng = np.random.RandomState(seed)
+    dense = (rng.rand(n_users, n_products) < density) * rng.randint(1, 6, size=(n_users, n_products))
+    dense[3] = rng.randint(1, 6, size=n_products)
+    return sparse.csr_matrix(dense.astype(np.float64))
+
+
+def direct_als_solve(matrix, fixed, alpha, regularization):
+    """x_u = (Yᵀ C_u Y + λI)⁻¹ Yᵀ C_u p_u for every row, with dense C_u"""
+    dense = matrix.toarray()
+    k = fixed.shape[1]
+    out = np.empty((dense.shape[0], k))
+    for u, row in enumerate(dense):
+        confidence = 1 + alpha * row
+        preference = (row > 0).astype(np.float64)
+        lhs = fixed.T @ (fixed * confidence[:, np.newaxis]) + regularization * np.eye(k)
+        out[u] = np.linalg.solve(lhs, fixed.T @ (confidence * preference))
+    return out
+
+
+@pytest.mark.parametrize("block_size, block_bytes", [
+    (256, 32 * 2**20),     # one block
+    (7, 32 * 2**20),       # blocks cut by rows
+    (256, 8 * 4 * 4 * 9),  # blocks cut by nonzeros; the dense user exceeds the budget alone
+])
+def test_als_half_step_matches_a_direct_solve(block_size, block_bytes):
+    matrix = interaction_matrix()
+    fixed = np.random.RandomState(2).normal(size=(matrix.shape[1], 4))
+    engine = ImplicitALSEngine(n_factors=4, alpha=10.0, regularization=0.5, n_threads=2,
+                               block_size=block_size, block_bytes=block_bytes)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        solved = engine._solve(matrix, fixed, pool)
+
+    np.testing.assert_allclose(solved, direct_als_solve(matrix, fixed, 10.0, 0.5), rtol=1e-10, atol=1e-12)
+
+
+def test_als_row_blocks_cover_every_row_within_the_budget():
+    matrix = interaction_matrix()
+    engine = ImplicitALSEngine(n_factors=4, block_size=5, block_bytes=8 * 4 * 4 * 9)
+
+    blocks = engine._row_blocks(matrix.indptr, 4)
+
+    assert blocks[0][0] == 0 and blocks[-1][1] == matrix.shape[0]
+    assert all(stop == next_start for (_, stop), (next_start, _) in zip(blocks, blocks[1:]))
+    for start, stop in blocks:
+        assert 0 < stop - start <= 5
+        nnz = matrix.indptr[stop] - matrix.indptr[start]
+        assert nnz <= 9 or stop - start == 1
+
+
+def test_als_fit_ends_on_a_product_half_step():
+    matrix = interaction_matrix()
+    engine = ImplicitALSEngine(n_factors=4, alpha=10.0, regularization=0.5, max_iter=5, n_threads=2)
+
+    user_factors, product_factors, info = engine.fit(matrix)
+
+    assert info["iterations"] == 5
+    assert user_factors.shape == (50, 4) and product_factors.shape == (30, 4)
+    np.testing.assert_allclose(product_factors, direct_als_solve(matrix.T.tocsr(), user_factors, 10.0, 0.5),
+                               rtol=1e-10, atol=1e-12)
+
+
+def dense_als_loss(matrix, user_factors, product_factors, alpha, regularization):
+    dense = matrix.toarray()
+    scores = user_factors @ product_factors.T
+    confidence = 1 + alpha * dense
+    return float((confidence * ((dense > 0) - scores) ** 2).sum()
+                 + regularization * ((user_factors ** 2).sum() + (product_factors ** 2).sum()))
+
+
+def test_als_loss_matches_the_dense_objective():
+    matrix = interaction_matrix()
+    rng = np.random.RandomState(3)
+    user_factors, product_factors = rng.normal(size=(50, 4)), rng.normal(size=(30, 4))
+    # A tiny budget, so the nonzeros are scored in several chunks
+    engine = ImplicitALSEngine(n_factors=4, alpha=10.0, regularization=0.5, block_bytes=8 * 4 * 4 * 9)
+
+    assert engine._loss(matrix, user_factors, product_factors) == \
+        pytest.approx(dense_als_loss(matrix, user_factors, product_factors, 10.0, 0.5), rel=1e-10)
+
+
+def preference_matrix(rng, preferences, per_user):
+    """Each user picks per_user products with probability proportional to their preference"""
+    rows, cols = [], []
+    for user, row in enumerate(preferences):
+        rows += [user] * per_user
+        cols += list(rng.choice(len(row), size=per_user, replace=False, p=row))
+    weights = rng.randint(1, 6, size=len(rows)).astype(np.float64)
+    return sparse.csr_matrix((weights, (rows, cols)), shape=preferences.shape)
+
+
+def test_als_warm_start_on_a_slightly_changed_matrix_needs_fewer_sweeps():
+    rng = np.random.RandomState(4)
+    preferences = rng.gamma(1, 1, size=(400, 3)) @ rng.gamma(1, 1, size=(3, 120))
+    preferences /= preferences.sum(axis=1, keepdims=True)
+    matrix = preference_matrix(rng, preferences, 8)
+    # A day later: a few more interactions
+    changed = matrix.maximum(preference_matrix(rng, preferences, 1))
+    user_ids, product_ids = list(range(400)), list(range(120))
+    engine = ImplicitALSEngine(n_factors=6, max_iter=50, n_threads=1)
+
+    user_factors, product_factors, _ = engine.fit(matrix)
+    warm_start = {
+        "user_ids": user_ids, "user_factors": user_factors,
+        # The last five products are new
+        "product_ids": product_ids[:-5], "product_factors": product_factors[:-5],
+        "current_user_ids": user_ids, "current_product_ids": product_ids,
+    }
+    _, _, warm = engine.fit(changed, warm_start=warm_start)
+    _, _, cold = engine.fit(changed)
+
+    assert warm["warm_start"] and not cold["warm_start"]
+    assert cold["iterations"] < 50
+    assert warm["iterations"] < cold["iterations"]
+    assert warm["loss"] <= cold["loss"]
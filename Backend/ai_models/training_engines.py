@@ -0,0 +1,488 @@
+"""
+Training engines for the Collaborative Filtering model
+
+Every engine factorizes the sparse User × Product matrix into the same
+factor interface used by CollaborativeFilteringModel:
+
+    user_factors    (n_users × k)
+    product_factors (n_products × k)
+
+    predicted score = user_factors[u] · product_factors[p]
+
+Engines:
+    svd       → TruncatedSVD from scratch (original behaviour, in collaborative_filtering.py)
+    subspace  → Randomized subspace iteration, warm-started from the previous model
+    als       → Confidence-weighted implicit-feedback ALS, solved in parallel blocks
+    outofcore → Subspace iteration with a few streaming passes over a
+                memory-mapped snapshot (matrix_snapshot.MemmapCSR)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import sparse
+
+
+def align_factors(previous_ids, previous_factors, current_ids):
+    """
+    Re-order a previous model's factor rows to match the current ids
+
+    Args:
+        previous_ids: Ids the previous factors were trained on
+        previous_factors: Array (len(previous_ids) × k)
+        current_ids: Ids of the matrix being trained now
+
+    Returns:
+        (aligned, known) where aligned is (len(current_ids) × k) with zero rows
+        for ids the previous model never saw, and known is a boolean mask of
+        the rows that were copied over
+    """
+    previous_index = {item_id: i for i, item_id in enumerate(previous_ids)}
+    aligned = np.zeros((len(current_ids), previous_factors.shape[1]))
+    known = np.zeros(len(current_ids), dtype=bool)
+
+    for i, item_id in enumerate(current_ids):
+        j = previous_index.get(item_id)
+        if j is not None:
+            aligned[i] = previous_factors[j]
+            known[i] = True
+
+    return aligned, known
+
+
+def _matmat(matrix, block):
+    """matrix @ block for in-memory sparse matrices and memory-mapped snapshots"""
+    if hasattr(matrix, 'iter_row_chunks'):
+        return matrix.dot(block)
+    return matrix @ block
+
+
+def _rmatmat(matrix, block):
+    """matrix.T @ block for in-memory sparse matrices and memory-mapped snapshots"""
+    if hasattr(matrix, 'iter_row_chunks'):
+        return matrix.rdot(block)
+    return matrix.T @ block
+
+
+def explained_variance_ratio(matrix, user_factors):
+    """
+    Share of the matrix's column variance captured by the user factors
+
+    Same definition as TruncatedSVD.explained_variance_ratio_.sum(), computed
+    without densifying the sparse matrix.
+    """
+    n_users = matrix.shape[0]
+    if n_users == 0:
+        return 0.0
+
+    if hasattr(matrix, 'column_moments'):
+        column_mean, column_sq_mean = matrix.column_moments()
+    else:
+        column_mean = np.asarray(matrix.mean(axis=0)).ravel()
+        column_sq_mean = np.asarray(matrix.multiply(matrix).mean(axis=0)).ravel()
+    total_var = float((column_sq_mean - column_mean ** 2).sum())
+    if total_var <= 0:
+        return 0.0
+
+    return float(np.var(user_factors, axis=0).sum() / total_var)
+
+
+class SubspaceIterationEngine:
+    """
+    Randomized subspace iteration (block power method) for a rank-k SVD
+
+    R ≈ U Σ Vᵀ is found by repeatedly multiplying a block of k + oversample
+    vectors by R and Rᵀ and re-orthonormalizing. The block can start from the
+    previous model's product factors, so a daily retrain where only a few
+    interactions changed converges in a couple of iterations instead of a
+    full solve from random vectors.
+
+    Factors match TruncatedSVD: user_factors = R V (= U Σ), product_factors = V.
+    """
+
+    name = "subspace"
+    factor_family = "svd"
+
+    @staticmethod
+    def to_rating(scores):
+        """Scores are reconstructed ratings: clip to the 1-5 rating scale"""
+        return np.clip(scores, 1, 5)
+
+    @staticmethod
+    def fold_in(product_factors, columns, weights):
+        """
+        Project an interaction row onto the factor space: r V
+
+        Training builds user_factors the same way (R V), so stored user factors
+        plus the fold-in of the change to the user's row (r_new - r_old) equal
+        what a retrain with the same product factors would give the user.
+        """
+        return np.asarray(weights, dtype=np.float64) @ np.asarray(product_factors[columns], dtype=np.float64)
+
+    def __init__(self, n_factors=10, oversample=5, max_iter=15, tol=1e-4, random_state=42):
+        """
+        Args:
+            n_factors: Number of latent factors
+            oversample: Extra vectors in the block (improves accuracy of the last factors)
+            max_iter: Upper bound on power iterations
+            tol: Stop once the relative change of the singular values is below this
+            random_state: Seed for the random part of the starting block
+        """
+        self.n_factors = n_factors
+        self.oversample = oversample
+        self.max_iter = max_iter
+        self.tol = tol
+        self.random_state = random_state
+
+    def _starting_block(self, matrix, k, block_size, warm_start):
+        """Build the initial product-space block (n_products × block_size)"""
+        n_products = matrix.shape[1]
+        rng = np.random.RandomState(self.random_state)
+        block = rng.normal(size=(n_products, block_size))
+
+        if warm_start is None:
+            return block, False
+
+        product_factors, product_known = align_factors(
+            warm_start["product_ids"], warm_start["product_factors"], warm_start["current_product_ids"]
+        )
+        user_factors, _ = align_factors(
+            warm_start["user_ids"], warm_start["user_factors"], warm_start["current_user_ids"]
+        )
+        n_warm = min(k, product_factors.shape[1])
+        product_factors = product_factors[:, :n_warm]
+        user_factors = user_factors[:, :n_warm]
+
+        # New products: fold them into the previous factor space using the
+        # users who interacted with them (vᵀ = rᵀ U Σ⁻¹ = rᵀ (UΣ) Σ⁻²)
+        if not product_known.all():
+            sigma_sq = (user_factors ** 2).sum(axis=0)
+            sigma_sq[sigma_sq == 0] = 1.0
+            folded = _rmatmat(matrix, user_factors / sigma_sq)
+            product_factors[~product_known] = folded[~product_known]
+
+        block[:, :n_warm] = product_factors
+        return block, True
+
+    def fit(self, matrix, warm_start=None):
+        """
+        Factorize a sparse User × Product matrix
+
+        Args:
+            matrix: scipy.sparse matrix or MemmapCSR snapshot (n_users × n_products)
+            warm_start: Optional dict with the previous model's user_ids, product_ids,
+                        user_factors, product_factors plus current_user_ids and
+                        current_product_ids for the matrix being trained
+
+        Returns:
+            (user_factors, product_factors, info) where info holds the number of
+            iterations, whether a warm start was used and the singular values
+        """
+        if not hasattr(matrix, 'iter_row_chunks'):
+            matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        n_users, n_products = matrix.shape
+        k = max(1, min(self.n_factors, n_users, n_products))
+        block_size = min(k + self.oversample, n_products)
+
+        block, warm = self._starting_block(matrix, k, block_size, warm_start)
+        Q, _ = np.linalg.qr(block)
+
+        singular_values = None
+        iterations = 0
+        for iterations in range(1, self.max_iter + 1):
+            P, _ = np.linalg.qr(_matmat(matrix, Q))
+            Q, T = np.linalg.qr(_rmatmat(matrix, P))
+
+            # Rᵀ P = Q T, so Pᵀ R = Tᵀ Qᵀ and the small triangle T carries
+            # the current estimates of the top singular values
+            current = np.linalg.svd(T, compute_uv=False)[:k]
+            if singular_values is not None:
+                change = np.abs(current - singular_values).max() / max(current[0], 1e-12)
+                if change < self.tol:
+                    singular_values = current
+                    break
+            singular_values = current
+
+        # Rotate the block onto the right singular vectors: Tᵀ = W Σ Zᵀ → V = Q Z
+        _, _, z_t = np.linalg.svd(T.T)
+        product_factors = (Q @ z_t.T)[:, :k]
+        user_factors = _matmat(matrix, product_factors)
+
+        info = {
+            "iterations": iterations,
+            "warm_start": warm,
+            "singular_values": singular_values,
+        }
+        return user_factors, product_factors, info
+
+
+class OutOfCoreSVDEngine(SubspaceIterationEngine):
+    """
+    Randomized SVD for snapshots that don't fit in memory
+
+    Same algorithm as SubspaceIterationEngine, tuned for streaming: a larger
+    oversampled block and only a few power iterations, so the whole fit is
+    2 * max_iter + 1 passes over the memory-mapped rows. Peak memory is one
+    row chunk plus the (n_users + n_products) × (k + oversample) blocks.
+    """
+
+    name = "outofcore"
+
+    def __init__(self, n_factors=10, oversample=10, max_iter=3, tol=1e-4, random_state=42):
+        super().__init__(n_factors=n_factors, oversample=oversample, max_iter=max_iter,
+                         tol=tol, random_state=random_state)
+
+
+class ImplicitALSEngine:
+    """
+    Implicit-feedback Alternating Least Squares (Hu, Koren & Volinsky 2008)
+
+    Interaction weights (view=1, cart=2, save=3, purchase=5+) are treated as
+    confidence that the user likes the product, not as ratings:
+
+        preference p_ui = 1 if r_ui > 0 else 0
+        confidence c_ui = 1 + alpha * r_ui
+
+    Unobserved pairs are weak negatives (c = 1, p = 0) instead of real zero
+    ratings. Each half-step solves, for every user (then every product),
+
+        x_u = (YᵀY + Yᵀ(C_u - I)Y + λI)⁻¹ Yᵀ C_u p_u
+
+    touching only the user's nonzero entries. Sweeps stop once the objective
+
+        Σ c_ui (p_ui - x_u·y_i)² + λ (‖X‖² + ‖Y‖²)
+
+    improves by less than tol (relative). The factors themselves keep moving
+    by a few percent per sweep for dozens of sweeps, so a test on their change
+    would never stop early.
+
+    Rows are split into blocks; each block is assembled and solved with whole-array numpy operations, which
+    release the GIL, so the blocks run in parallel on a thread pool. Blocks are
+    cut by nonzeros as well as rows, so the per-nonzero k × k terms of a block
+    stay within block_bytes however skewed the product popularity is.
+    """
+
+    name = "als"
+    factor_family = "implicit"
+
+    @staticmethod
+    def to_rating(scores):
+        """Scores are predicted preferences (≈0-1): map them onto the 1-5 rating scale"""
+        return 1 + 4 * np.clip(scores, 0, 1)
+
+    def __init__(self, n_factors=10, alpha=40.0, regularization=0.1, max_iter=15,
+                 tol=1e-2, n_threads=None, block_size=256, block_bytes=32 * 2**20, random_state=42):
+        """
+        Args:
+            n_factors: Number of latent factors
+            alpha: Confidence scaling of the interaction weights
+            regularization: L2 penalty λ
+            max_iter: Upper bound on ALS sweeps (one sweep = users + products)
+            tol: Stop once a sweep lowers the objective by less than this fraction
+            n_threads: Thread pool size (default: number of CPUs)
+            block_size: Rows per parallel solve block
+            block_bytes: Memory budget of one block's per-nonzero k × k terms
+                         (peak memory is about n_threads × block_bytes)
+            random_state: Seed for the initial factors
+        """
+        self.n_factors = n_factors
+        self.alpha = alpha
+        self.regularization = regularization
+        self.max_iter = max_iter
+        self.tol = tol
+        self.n_threads = n_threads or os.cpu_count() or 1
+        self.block_size = block_size
+        self.block_bytes = block_bytes
+        self.random_state = random_state
+        self._gram = None
+        self._gram_source = None
+
+    def _nnz_budget(self, k):
+        """Nonzeros per block whose k × k outer products fit in block_bytes"""
+        return max(1, self.block_bytes // (8 * k * k))
+
+    def _row_blocks(self, indptr, k):
+        """
+        Cut the rows into solve blocks of at most block_size rows and at most
+        the nonzero budget; a single row above the budget gets a block of its own
+        """
+        n_rows = len(indptr) - 1
+        budget = self._nnz_budget(k)
+        blocks = []
+        start = 0
+        while start < n_rows:
+            # Last row boundary within the budget (indptr[stop] - indptr[start] <= budget)
+            stop = int(np.searchsorted(indptr, indptr[start] + budget, side='right')) - 1
+            stop = min(max(stop, start + 1), start + self.block_size, n_rows)
+            blocks.append((start, stop))
+            start = stop
+        return blocks
+
+    def _solve_block(self, matrix, fixed, gram, out, start, stop):
+        """Solve the least-squares problems of rows [start, stop) into out"""
+        lo, hi = matrix.indptr[start], matrix.indptr[stop]
+        row_starts = matrix.indptr[start:stop] - lo
+        row_lengths = np.diff(matrix.indptr[start:stop + 1])
+        nonempty = row_lengths > 0
+        k = gram.shape[0]
+
+        lhs = np.repeat(gram[np.newaxis], stop - start, axis=0)
+        rhs = np.zeros((stop - start, k))
+
+        if hi - lo > self._nnz_budget(k):
+            # One very popular row (alone in its block, see _row_blocks):
+            # accumulate Yᵀ(C - I)Y with matrix products over chunks of its
+            # nonzeros, never materializing per-nonzero outer products
+            chunk = self._nnz_budget(k) * k
+            for chunk_lo in range(lo, hi, chunk):
+                chunk_hi = min(chunk_lo + chunk, hi)
+                factors = fixed[matrix.indices[chunk_lo:chunk_hi]]
+                confidence = self.alpha * matrix.data[chunk_lo:chunk_hi]
+                lhs[0] += factors.T @ (factors * confidence[:, np.newaxis])
+                rhs[0] += factors.T @ (confidence + 1)
+        elif hi > lo:
+            # Per nonzero: (c - 1) f fᵀ and c f, then summed per row. Whole-block
+            # array ops (no per-row Python loop) keep the GIL released.
+            factors = fixed[matrix.indices[lo:hi]]
+            confidence = self.alpha * matrix.data[lo:hi]
+            outer = factors[:, :, np.newaxis] * (factors * confidence[:, np.newaxis])[:, np.newaxis, :]
+            lhs[nonempty] += np.add.reduceat(outer, row_starts[nonempty], axis=0)
+            rhs[nonempty] = np.add.reduceat(factors * (confidence + 1)[:, np.newaxis], row_starts[nonempty], axis=0)
+
+        out[start:stop] = np.linalg.solve(lhs, rhs[..., np.newaxis])[..., 0]
+
+    def fold_in(self, product_factors, columns, weights):
+        """
+        Solve one user's factors against fixed product factors
+
+        The same least-squares problem as a training half-step, for a single
+        row. YᵀY + λI is cached per product factor matrix, so a call costs the
+        row's nonzeros plus one k × k solve.
+        """
+        if self._gram_source is not product_factors:
+            fixed = np.asarray(product_factors, dtype=np.float64)
+            self._gram = fixed.T @ fixed + self.regularization * np.eye(fixed.shape[1])
+            self._gram_source = product_factors
+
+        factors = np.asarray(product_factors[columns], dtype=np.float64)
+        confidence = self.alpha * np.asarray(weights, dtype=np.float64)
+        lhs = self._gram + factors.T @ (factors * confidence[:, np.newaxis])
+        rhs = factors.T @ (confidence + 1)
+        return np.linalg.solve(lhs, rhs)
+
+    def _loss(self, user_items, user_factors, product_factors):
+        """
+        The implicit-feedback objective, without touching the unobserved pairs
+
+        Σ_all (x·y)² = tr(XᵀX YᵀY) covers every pair with c = 1, p = 0; the
+        observed pairs are then corrected to c (1 - x·y)². The per-nonzero
+        scores are computed in chunks of the block nonzero budget.
+        """
+        k = user_factors.shape[1]
+        loss = float(np.trace((user_factors.T @ user_factors) @ (product_factors.T @ product_factors)))
+        loss += self.regularization * float((user_factors ** 2).sum() + (product_factors ** 2).sum())
+
+        rows = np.repeat(np.arange(user_items.shape[0]), np.diff(user_items.indptr))
+        chunk = self._nnz_budget(k) * k
+        for lo in range(0, user_items.nnz, chunk):
+            hi = min(lo + chunk, user_items.nnz)
+            scores = np.einsum('ij,ij->i', user_factors[rows[lo:hi]], product_factors[user_items.indices[lo:hi]])
+            confidence = 1 + self.alpha * user_items.data[lo:hi]
+            loss += float((confidence * (1 - scores) ** 2 - scores ** 2).sum())
+        return loss
+
+    def _solve(self, matrix, fixed, pool):
+        """One half-step: solve every row of matrix against the fixed factors"""
+        n_rows = matrix.shape[0]
+        gram = fixed.T @ fixed + self.regularization * np.eye(fixed.shape[1])
+        out = np.empty((n_rows, fixed.shape[1]))
+
+        futures = [
+            pool.submit(self._solve_block, matrix, fixed, gram, out, start, stop)
+            for start, stop in self._row_blocks(matrix.indptr, fixed.shape[1])
+        ]
+        for future in futures:
+            future.result()
+
+        return out
+
+    def fit(self, matrix, warm_start=None):
+        """
+        Factorize a sparse User × Product interaction matrix
+
+        Args:
+            matrix: scipy.sparse matrix (n_users × n_products) of interaction weights
+            warm_start: Optional previous factors, same format as SubspaceIterationEngine.fit
+
+        Returns:
+            (user_factors, product_factors, info)
+        """
+        user_items = sparse.csr_matrix(matrix, dtype=np.float64)
+        item_users = user_items.T.tocsr()
+        n_users, n_products = user_items.shape
+        k = self.n_factors
+
+        rng = np.random.RandomState(self.random_state)
+        user_factors = rng.normal(scale=0.01, size=(n_users, k))
+        product_factors = rng.normal(scale=0.01, size=(n_products, k))
+
+        warm = warm_start is not None
+        with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+            if warm:
+                previous_products, products_known = align_factors(
+                    warm_start["product_ids"], warm_start["product_factors"], warm_start["current_product_ids"]
+                )
+                if previous_products.shape[1] == k:
+                    # The first sweep starts from the previous product factors
+                    product_factors[products_known] = previous_products[products_known]
+                    new_products = np.flatnonzero(~products_known)
+                    if len(new_products):
+                        # New products get the least-squares solution against
+                        # the previous user factors rather than random values
+                        previous_users, users_known = align_factors(
+                            warm_start["user_ids"], warm_start["user_factors"], warm_start["current_user_ids"]
+                        )
+                        user_factors[users_known] = previous_users[users_known]
+                        product_factors[new_products] = self._solve(item_users[new_products], user_factors, pool)
+                else:
+                    warm = False
+
+            iterations = 0
+            loss = None
+            for iterations in range(1, self.max_iter + 1):
+                user_factors = self._solve(user_items, product_factors, pool)
+                product_factors = self._solve(item_users, user_factors, pool)
+
+                previous_loss, loss = loss, self._loss(user_items, user_factors, product_factors)
+                if previous_loss is not None and previous_loss - loss < self.tol * abs(previous_loss):
+                    break
+
+        info = {
+            "iterations": iterations,
+            "warm_start": warm,
+            "n_threads": self.n_threads,
+            "loss": loss,
+        }
+        return user_factors, product_factors, info
+
+
+ENGINES = {
+    SubspaceIterationEngine.name: SubspaceIterationEngine,
+    ImplicitALSEngine.name: ImplicitALSEngine,
+    OutOfCoreSVDEngine.name: OutOfCoreSVDEngine,
+}
+
+
+def compatible_factors(engine_a, engine_b):
+    """True if factors trained by one engine can warm start the other"""
+    family_a = getattr(ENGINES.get(engine_a), 'factor_family', engine_a)
+    family_b = getattr(ENGINES.get(engine_b), 'factor_family', engine_b)
+    return family_a == family_b
+
+
+def get_engine(name, n_factors=10, **kwargs):
+    """Create a training engine by name"""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown training engine: {name}. Available: {', '.join(sorted(ENGINES))}")
+    return ENGINES[name](n_factors=n_factors, **kwargs)
+
@@ -0,0 +1,44 @@
+const mongoose = require('mongoose');
+
+/**
+ * Precomputed CF recommendations, one document per user
+ * Written by the Python model after each training run
+ * (ai_models/recommendation_store.py) - only users whose list changed are rewritten
+ */
+const recommendationSchema = new mongoose.Schema({
+  userId: {
+    type: String,
+    required: true,
+    unique: true
+  },
+  recommendations: [{
+    _id: false,
+    productId: String,
+    predictedRating: Number
+  }],
+  /**
+   * Hash of the ordered product ids, used to skip unchanged lists
+   */
+  digest: {
+    type: String
+  },
+  /**
+   * Shared model version that last changed this list
+   */
+  modelVersion: {
+    type: String
+  },
+  updatedAt: {
+    type: Date,
+    default: Date.now
+  },
+  /**
+   * Time of the user's latest tracked interaction, set by Node (never by
+   * the publisher); later than updatedAt means the list predates it
+   */
+  lastInteractionAt: {
+    type: Date
+  }
+});
+
+module.exports = mongoose.model('Recommendation', recommendationSchema, 'recommendations');
@@ -3,6 +3,7 @@ const Product = require('../models/product');
 const User = require('../models/User');
 const Seller = require('../models/seller');
 const Interaction = require('../models/interaction');
+const Recommendation = require('../models/recommendation');
 const CFRecommender = require('../utils/cfRecommender');
 const fs = require('fs');
 const path = require('path');
@@ -289,13 +290,28 @@ router.get("/recommendations/:userId", async (req, res) => {
         const { userId } = req.params;
         const numRecommendations = parseInt(req.query.num) || 5;
 
+        // Precomputed top-K list written after each training run: one indexed
+        // read, no Python. Users who interacted since it was written go through
+        // the session-aware model instead, so their latest interactions count.
+        let cfRecs = null;
+        const materialized = await Recommendation.findOne({ userId: String(userId) }).lean();
+        if (materialized && !cfRecommender.hasRecentSession(materialized) &&
+            materialized.recommendations.length >= numRecommendations) {
+            cfRecs = materialized.recommendations.slice(0, numRecommendations).map(rec => ({
+                productId: rec.productId,
+                predictedRating: rec.predictedRating,
+                reason: 'Based on collaborative filtering analysis of user behavior'
+            }));
+        }
+        const precomputed = cfRecs !== null;
+
         // Initialize CF model on first call
-        if (!cfRecommender.modelReady) {
+        if (!precomputed && !cfRecommender.modelReady) {
             await cfRecommender.initialize();
         }
 
         // Get recommendations from CF model
-        if (!cfRecommender.modelReady) {
+        if (!precomputed && !cfRecommender.modelReady) {
             // CF model not available, return popular products as fallback
             const popularProducts = await Product.find({ status: 'active' })
                 .populate('sellerId', 'storeName businessName')
@@ -310,7 +326,9 @@ router.get("/recommendations/:userId", async (req, res) => {
         }
 
         // Get CF recommendations (based on user's purchase/cart history from MongoDB Atlas)
-        const cfRecs = await cfRecommender.recommendForUser(userId, numRecommendations);
+        if (!precomputed) {
+            cfRecs = await cfRecommender.recommendForUser(userId, numRecommendations);
+        }
         
         // Fetch actual product details from database
         const recommendations = [];
@@ -352,7 +370,8 @@ router.get("/recommendations/:userId", async (req, res) => {
             success: true,
             count: recommendations.length,
             recommendations,
-            source: recommendations.length > cfRecs.length ? 'collaborative_filtering_ai_with_fallback' : 'collaborative_filtering_ai'
+            source: (recommendations.length > cfRecs.length ? 'collaborative_filtering_ai_with_fallback' : 'collaborative_filtering_ai') +
+                (precomputed ? '_precomputed' : '')
         });
 
     } catch (error) {
@@ -366,19 +385,16 @@ router.get("/recommendations/:userId", async (req, res) => {
 });
 
 // Get model statistics (for debugging/reporting)
+// Reads the model metadata sidecar only - never initializes or retrains the model
 router.get("/ai/model-stats", async (req, res) => {
     try {
-        if (!cfRecommender.modelReady) {
-            await cfRecommender.initialize();
-        }
-
         const stats = await cfRecommender.getModelStats();
 
         res.json({
             success: true,
             model: {
                 type: 'Collaborative Filtering (SVD)',
-                status: cfRecommender.modelReady ? 'ready' : 'not_ready',
+                status: cfRecommender.modelReady || stats.status === 'trained' ? 'ready' : 'not_ready',
                 ...stats
             }
         });
@@ -459,10 +475,34 @@ router.get("/related/:userId", async (req, res) => {
             await cfRecommender.initialize();
         }
 
-        // Get personalized recommendations from CF model
         let relatedProducts = [];
-        
-        if (cfRecommender.modelReady) {
+        let source = 'popularity_based';
+
+        // "Bought together" products from the item-item co-occurrence model
+        try {
+            const itemRecs = await cfRecommender.getRelatedProducts(userId, numProducts);
+
+            for (const rec of itemRecs) {
+                const product = await Product.findById(rec.product_id)
+                    .populate('sellerId', 'storeName businessName');
+
+                if (product && product.status === 'active') {
+                    relatedProducts.push({
+                        ...product.toObject(),
+                        similarityScore: rec.score,
+                        reason: 'Frequently bought together'
+                    });
+                }
+            }
+            if (relatedProducts.length > 0) {
+                source = 'item_cooccurrence';
+            }
+        } catch (itemError) {
+            console.warn('Item-item model error, falling back to CF:', itemError.message);
+        }
+
+        // Otherwise get personalized recommendations from CF model
+        if (relatedProducts.length === 0 && cfRecommender.modelReady) {
             try {
                 // Get recommendations from CF model
                 const cfRecs = await cfRecommender.recommendForUser(userId, numProducts);
@@ -480,6 +520,9 @@ router.get("/related/:userId", async (req, res) => {
                         });
                     }
                 }
+                if (relatedProducts.length > 0) {
+                    source = 'collaborative_filtering_ai';
+                }
             } catch (cfError) {
                 console.warn('CF model error, falling back to category-based:', cfError.message);
             }
@@ -510,7 +553,7 @@ router.get("/related/:userId", async (req, res) => {
             success: true,
             count: relatedProducts.length,
             relatedProducts,
-            source: cfRecommender.modelReady ? 'collaborative_filtering_ai' : 'popularity_based'
+            source
         });
 
     } catch (error) {
@@ -591,6 +634,7 @@ router.post("/:productId/view", async (req, res) => {
         });
         
         await interaction.save();
+        cfRecommender.ingestInteraction(userId, productId, interaction.weight);
         
         res.status(200).json({
             success: true,
@@ -635,6 +679,7 @@ router.post("/:productId/cart", async (req, res) => {
         });
         
         await interaction.save();
+        cfRecommender.ingestInteraction(userId, productId, interaction.weight);
         
         res.status(200).json({
             success: true,
@@ -679,6 +724,7 @@ router.post("/:productId/save", async (req, res) => {
         });
         
         await interaction.save();
+        cfRecommender.ingestInteraction(userId, productId, interaction.weight);
         
         res.status(200).json({
             success: true,
@@ -732,6 +778,7 @@ router.post("/:productId/purchase", async (req, res) => {
         });
         
         await interaction.save();
+        cfRecommender.ingestInteraction(userId, productId, interaction.weight);
         
         res.status(200).json({
             success: true,
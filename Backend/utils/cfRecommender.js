@@ -7,15 +7,26 @@ const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs');
 const Product = require('../models/product');
+const Recommendation = require('../models/recommendation');
 
 const AI_MODELS_DIR = path.join(__dirname, '..', 'ai_models');
 const CF_INTEGRATION_SCRIPT = path.join(AI_MODELS_DIR, 'cf_integration.py');
+// Model metadata sidecar written by cf_integration.py after each training run
+const CF_METADATA_PATH = path.join(AI_MODELS_DIR, 'cf_model_meta.json');
+const SESSION_REQUEST_TIMEOUT_MS = 2000;
+// Matches the session buffer's TTL in ai_models/session_buffer.py
+const SESSION_TTL_MS = 30 * 60 * 1000;
+// An active user's stale flag is re-stamped at most this often, well within the TTL
+const STALE_FLAG_REFRESH_MS = SESSION_TTL_MS / 2;
 
 class CFRecommender {
   constructor() {
     this.modelReady = false;
     this.initializationError = null;
     this.lastProductCount = 0;
+    this.sessionServer = null;
+    this.sessionRequests = new Map();
+    this.nextSessionRequestId = 1;
   }
 
   /**
@@ -73,8 +84,8 @@ class CFRecommender {
           }
         }
         
-        // Get model stats (initializes fresh model with new counts)
-        this.getModelStats(productCount, userCount)
+        // Train a fresh model with the new counts
+        this.trainModel(productCount, userCount)
           .then((stats) => {
             console.log('✓ CF Model initialized successfully');
             console.log(`  Users: ${stats.n_users}, Products: ${stats.n_products}`);
@@ -105,11 +116,33 @@ class CFRecommender {
    *   ]
    */
   async getRecommendations(userId, numRecommendations = 5) {
-    return new Promise((resolve, reject) => {
-      if (!this.modelReady) {
-        return reject(new Error('CF model not initialized'));
+    if (!this.modelReady) {
+      throw new Error('CF model not initialized');
+    }
+
+    // Session-aware path: the long-running Python process blends the user's
+    // recent interactions into their stored factors
+    try {
+      const result = await this.sendSessionRequest({
+        command: 'recommend',
+        user_id: String(userId),
+        num_recommendations: numRecommendations
+      });
+      if (result.success) {
+        return result.recommendations || [];
       }
+    } catch (error) {
+      // Session server unavailable: fall back to a one-off Python process
+    }
+
+    return this.runRecommendCommand(userId, numRecommendations);
+  }
 
+  /**
+   * Get recommendations from a one-off `cf_integration.py recommend` process
+   */
+  async runRecommendCommand(userId, numRecommendations = 5) {
+    return new Promise((resolve, reject) => {
       const python = spawn('python', [
         CF_INTEGRATION_SCRIPT,
         'recommend',
@@ -151,26 +184,262 @@ class CFRecommender {
   }
 
   /**
-   * Get model statistics (for debugging/reporting)
-   * This also triggers retraining if counts don't match
+   * Start the long-running Python process (`cf_integration.py serve`) that
+   * keeps each active user's recent interactions in memory
+   * 
+   * Requests and responses are JSON lines; responses are matched to
+   * requests by id. Started lazily and restarted on the next call if it exits.
    */
-  async getModelStats(productCount = null, userCount = null) {
-    return new Promise((resolve, reject) => {
-      const args = [CF_INTEGRATION_SCRIPT, 'stats'];
-      
-      // Pass counts if provided (triggers retraining if model file doesn't match)
-      if (productCount !== null) {
-        args.push(`n_products=${productCount}`);
+  startSessionServer() {
+    if (this.sessionServer) {
+      return this.sessionServer;
+    }
+
+    const python = spawn('python', [CF_INTEGRATION_SCRIPT, 'serve']);
+    this.sessionServer = python;
+
+    let buffer = '';
+    python.stdout.on('data', (data) => {
+      buffer += data.toString();
+      let newline;
+      while ((newline = buffer.indexOf('\n')) >= 0) {
+        const line = buffer.slice(0, newline);
+        buffer = buffer.slice(newline + 1);
+        try {
+          const response = JSON.parse(line);
+          const pending = this.sessionRequests.get(response.id);
+          if (pending) {
+            this.sessionRequests.delete(response.id);
+            pending.resolve(response);
+          }
+        } catch (parseError) {
+          console.warn('⚠️  Unreadable session server output:', line);
+        }
       }
-      if (userCount !== null) {
-        args.push(`n_users=${userCount}`);
+    });
+
+    python.stderr.on('data', (data) => {
+      console.log('Python session server stderr:', data.toString());
+    });
+
+    const stopped = () => {
+      if (this.sessionServer !== python) {
+        return;
       }
-      
-      // Pass DB_URI from environment to Python
-      if (process.env.DB_URI) {
-        args.push(`db_uri=${process.env.DB_URI}`);
+      this.sessionServer = null;
+      for (const pending of this.sessionRequests.values()) {
+        pending.reject(new Error('Session server exited'));
       }
-      
+      this.sessionRequests.clear();
+    };
+    python.on('close', stopped);
+    python.on('error', stopped);
+    python.stdin.on('error', stopped);
+
+    return python;
+  }
+
+  /**
+   * Send one request to the session server and wait for its response
+   */
+  async sendSessionRequest(request) {
+    const python = this.startSessionServer();
+    const id = this.nextSessionRequestId++;
+
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.sessionRequests.delete(id);
+        reject(new Error('Session server timed out'));
+      }, SESSION_REQUEST_TIMEOUT_MS);
+
+      this.sessionRequests.set(id, {
+        resolve: (response) => {
+          clearTimeout(timer);
+          resolve(response);
+        },
+        reject: (error) => {
+          clearTimeout(timer);
+          reject(error);
+        }
+      });
+      python.stdin.write(JSON.stringify({ ...request, id }) + '\n');
+    });
+  }
+
+  /**
+   * Feed a new interaction to the session server (fire-and-forget)
+   * 
+   * The interaction is already saved in MongoDB; this only makes it count
+   * for the user's recommendations before the next training run. The time
+   * is also stamped on the user's precomputed list, so every Node worker
+   * knows the list is stale (see hasRecentSession). The filter only matches
+   * lists not already flagged (or flagged long enough ago to need a refresh
+   * before the TTL runs out), so a burst of interactions costs one write.
+   */
+  ingestInteraction(userId, productId, weight = 1) {
+    const now = new Date();
+    const lastInteractionAt = { $ifNull: ['$lastInteractionAt', new Date(0)] };
+    Recommendation.updateOne(
+      {
+        userId: String(userId),
+        $expr: {
+          $or: [
+            { $lte: [lastInteractionAt, '$updatedAt'] },
+            { $lt: [lastInteractionAt, new Date(now.getTime() - STALE_FLAG_REFRESH_MS)] }
+          ]
+        }
+      },
+      { $set: { lastInteractionAt: now } }
+    ).catch(error => {
+      console.warn('⚠️  Could not flag precomputed recommendations as stale:', error.message);
+    });
+
+    try {
+      const python = this.startSessionServer();
+      python.stdin.write(JSON.stringify({
+        command: 'ingest',
+        user_id: String(userId),
+        product_id: String(productId),
+        weight
+      }) + '\n');
+    } catch (error) {
+      console.warn('⚠️  Could not buffer interaction for session scoring:', error.message);
+    }
+  }
+
+  /**
+   * True if the user interacted after their precomputed list was written and
+   * within the session TTL, i.e. the list may be stale
+   * 
+   * @param {Object} materialized - Document of the `recommendations` collection
+   */
+  hasRecentSession(materialized) {
+    const lastInteractionAt = materialized.lastInteractionAt;
+    if (!lastInteractionAt) {
+      return false;
+    }
+    return new Date(lastInteractionAt) > new Date(materialized.updatedAt) &&
+      Date.now() - new Date(lastInteractionAt).getTime() < SESSION_TTL_MS;
+  }
+
+  /**
+   * Get "bought together" products for a user from the item-item model
+   * 
+   * Answered by the long-running session server, which keeps the neighbour
+   * lists loaded and aggregates over the user's recent interactions; falls
+   * back to a one-off Python process if the server is unavailable.
+   * 
+   * Returns:
+   *   Array of related products: [
+   *     { product_id: "...", score: 3.2 },
+   *     ...
+   *   ]
+   */
+  async getRelatedProducts(userId, numProducts = 5) {
+    let result;
+    try {
+      result = await this.sendSessionRequest({
+        command: 'related',
+        user_id: String(userId),
+        num_products: numProducts
+      });
+    } catch (error) {
+      // Session server unavailable: fall back to a one-off Python process
+      return this.runRelatedCommand(userId, numProducts);
+    }
+
+    if (!result.success) {
+      throw new Error(result.error || 'Unknown error from Python model');
+    }
+    return result.related || [];
+  }
+
+  /**
+   * Get related products from a one-off `cf_integration.py related` process
+   */
+  async runRelatedCommand(userId, numProducts = 5) {
+    return new Promise((resolve, reject) => {
+      const python = spawn('python', [
+        CF_INTEGRATION_SCRIPT,
+        'related',
+        String(userId),
+        String(numProducts)
+      ]);
+
+      let output = '';
+      let error = '';
+
+      python.stdout.on('data', (data) => {
+        output += data.toString();
+      });
+
+      python.stderr.on('data', (data) => {
+        error += data.toString();
+      });
+
+      python.on('close', (code) => {
+        try {
+          const result = JSON.parse(output);
+
+          if (result.error) {
+            reject(new Error(result.error));
+          } else if (result.success) {
+            resolve(result.related || []);
+          } else {
+            reject(new Error('Unknown error from Python model'));
+          }
+        } catch (parseError) {
+          reject(new Error(`Python script failed with code ${code}: ${error || parseError.message}`));
+        }
+      });
+    });
+  }
+
+  /**
+   * Get model statistics (for debugging/reporting)
+   * Reads the model metadata sidecar written at training time directly
+   * (no Python process, no MongoDB access, no retraining), so it is safe to poll.
+   * The sidecar is replaced atomically, so a read never sees half a file.
+   */
+  async getModelStats() {
+    try {
+      return JSON.parse(await fs.promises.readFile(CF_METADATA_PATH, 'utf8'));
+    } catch (error) {
+      if (error.code === 'ENOENT') {
+        return { status: 'not_trained' };
+      }
+      throw error;
+    }
+  }
+
+  /**
+   * Train (or load) the model with the given counts and return its stats
+   * Retrains if the saved model doesn't match the counts
+   */
+  async trainModel(productCount = null, userCount = null) {
+    const args = [CF_INTEGRATION_SCRIPT, 'train'];
+
+    // Pass counts if provided (triggers retraining if model file doesn't match)
+    if (productCount !== null) {
+      args.push(`n_products=${productCount}`);
+    }
+    if (userCount !== null) {
+      args.push(`n_users=${userCount}`);
+    }
+
+    // Pass DB_URI from environment to Python
+    if (process.env.DB_URI) {
+      args.push(`db_uri=${process.env.DB_URI}`);
+    }
+
+    return this.runStatsCommand(args);
+  }
+
+  /**
+   * Run a cf_integration.py command that answers with { stats }
+   */
+  async runStatsCommand(args) {
+    return new Promise((resolve, reject) => {
       const python = spawn('python', args);
 
       let output = '';
@@ -233,7 +502,7 @@ class CFRecommender {
           // Call Python to build and save new model with current counts
           const args = [
             CF_INTEGRATION_SCRIPT,
-            'stats',
+            'train',
             `n_products=${productCount}`,
             `n_users=${userCount}`
           ];